@@ -0,0 +1,217 @@
+"""
+Closed-form IK for the 6-DOF unload arm (data/unload-gen0/robot_arm.urdf).
+
+The arm has a vertical base joint (a1), two parallel shoulder/elbow joints
+(a2, a3) and a spherical wrist (a4, a5, a6; a4 and a6 parallel at the zero
+configuration, a5 perpendicular to both), so IK decouples into a wrist-center
+position problem (a1 from a plane constraint, a2/a3 from a planar two-link
+problem) and a wrist orientation problem (a ZYZ Euler decomposition). This
+gives up to 8 solution branches (base front/back x elbow up/down x wrist
+flip).
+
+All kinematic parameters are extracted from the plant at the zero
+configuration (using the product-of-exponentials formulation, with every
+joint axis expressed in the world frame), so nothing is hard-coded. The
+wrist is spherical to within ~0.1 mm; solutions are optionally polished with
+a few Gauss-Newton steps on the plant's forward kinematics.
+
+The closed-form part is vectorized over poses.
+"""
+from pydrake.all import (
+    JacobianWrtVariable,
+)
+
+import numpy as np
+
+from kinematics import arm_chain
+
+
+def rotation_matrices(axis, angles):
+    """
+    Rodrigues' formula, vectorized over angles. Returns an (N, 3, 3) np array
+    of rotations by each angle about the unit axis.
+    """
+    K = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    angles = np.asarray(angles)[:, None, None]
+    return np.eye(3) + np.sin(angles) * K + (1 - np.cos(angles)) * (K @ K)
+
+
+def closest_point_between_lines(p1, a1, p2, a2):
+    """
+    Midpoint of the shortest segment between the lines p1 + t a1 and p2 + s a2.
+    """
+    A = np.array([[a1 @ a1, -a1 @ a2], [a1 @ a2, -a2 @ a2]])
+    t, s = np.linalg.solve(A, [(p2 - p1) @ a1, (p2 - p1) @ a2])
+    return (p1 + t * a1 + p2 + s * a2) / 2
+
+
+class AnalyticIK():
+    """
+    Closed-form IK for the "arm_eef" frame of a plant whose positions are the 6
+    arm joints. Raises ValueError if the plant's kinematics don't have the
+    structure described above.
+    """
+    def __init__(self, plant, eef_frame_name="arm_eef", tol=1e-3):
+        self.plant = plant
+        self.plant_context = plant.CreateDefaultContext()  # Used for verification/polishing
+        self.joints, self.eef_frame = arm_chain(plant, plant.GetModelInstanceName(plant.GetFrameByName(eef_frame_name).model_instance()), eef_frame_name)
+        if len(self.joints) != 6 or plant.num_positions() != 6 or any(joint.num_positions() != 1 for joint in self.joints):
+            raise ValueError("AnalyticIK requires a plant whose only positions are the 6 arm joints.")
+        self.position_indices = [joint.position_start() for joint in self.joints]
+        self.lower_limits = plant.GetPositionLowerLimits()[self.position_indices]
+        self.upper_limits = plant.GetPositionUpperLimits()[self.position_indices]
+
+        # Joint axes and points on them, and the end effector pose, at the zero configuration
+        plant.SetPositions(self.plant_context, np.zeros(6))
+        self.axes = []
+        self.points = []
+        for joint in self.joints:
+            X_WJ = joint.frame_on_child().CalcPoseInWorld(self.plant_context)
+            self.axes.append(X_WJ.rotation() @ joint.revolute_axis())
+            self.points.append(X_WJ.translation())
+        X_WE0 = self.eef_frame.CalcPoseInWorld(self.plant_context)
+        self.R_WE0 = X_WE0.rotation().matrix()
+        w = self.axes
+
+        self.wrist_center = closest_point_between_lines(self.points[3], w[3], self.points[4], w[4])
+        for i in (3, 4, 5):
+            distance = np.linalg.norm(np.cross(self.wrist_center - self.points[i], w[i]))
+            if distance > tol:
+                raise ValueError(f"Wrist is not spherical (joint {self.joints[i].name()} axis is {distance:.4f} m from the wrist center).")
+        if np.linalg.norm(np.cross(w[1], w[2])) > tol or abs(w[0] @ w[1]) > tol or \
+           np.linalg.norm(np.cross(w[3], w[5])) > tol or abs(w[3] @ w[4]) > tol:
+            raise ValueError("Arm joint axes don't have the expected structure.")
+        self.p_CE_E = self.R_WE0.T @ (X_WE0.translation() - self.wrist_center)  # End effector position relative to the wrist center, in the eef frame
+
+        # Basis of the plane normal to the (parallel) a2/a3 axes, with ea x eb = a2 axis
+        self.ea = w[0]
+        self.eb = np.cross(w[1], self.ea)
+
+        # Basis in which the wrist rotation is a ZYZ Euler rotation (z = a4 axis, y = a5 axis)
+        self.B = np.column_stack((np.cross(w[4], w[3]), w[4], w[3]))
+        self.a6_sign = np.sign(w[5] @ w[3])
+
+
+    def _plane(self, x):
+        return np.stack((x @ self.ea, x @ self.eb), axis=-1)
+
+
+    def solve_batch(self, poses):
+        """
+        poses is a list of N RigidTransforms (of the end effector in world).
+
+        Returns an (N, 8, 6) np array of solutions (one per branch) and an
+        (N, 8) boolean np array of which are valid (reachable and within the
+        joint limits). Solutions are not polished.
+        """
+        N = len(poses)
+        p_t = np.array([X.translation() for X in poses]).reshape(N, 3)
+        R_t = np.array([X.rotation().matrix() for X in poses]).reshape(N, 3, 3)
+        w, p = self.axes, self.points
+
+        c = p_t - R_t @ self.p_CE_E  # Wrist centers, (N, 3)
+
+        # a1: rotating the wrist center about a2/a3 preserves its a2-component,
+        # so a1 must rotate the a2 axis to satisfy (R1 w2) . (c - p1) = w2 . (c0 - p1)
+        e1 = w[1]
+        e2 = np.cross(w[0], e1)
+        u = c - p[0]
+        u_perp = u - np.outer(u @ w[0], w[0])
+        r = np.maximum(np.linalg.norm(u_perp, axis=1), 1e-12)
+        s = (w[1] @ (self.wrist_center - p[0])) / r
+        theta_u = np.arctan2(u_perp @ e2, u_perp @ e1)
+        base_valid = np.abs(s) <= 1
+        q1_branches = [theta_u + np.arccos(np.clip(s, -1, 1)), theta_u - np.arccos(np.clip(s, -1, 1))]
+
+        P2, P3, C0 = self._plane(p[1]), self._plane(p[2]), self._plane(self.wrist_center)
+        L2, L3 = np.linalg.norm(P3 - P2), np.linalg.norm(C0 - P3)
+        phi0 = np.arctan2(*(C0 - P3)[::-1]) - np.arctan2(*(P3 - P2)[::-1])
+
+        solutions = np.zeros((N, 8, 6))
+        valid = np.zeros((N, 8), dtype=bool)
+        for i, q1 in enumerate(q1_branches):
+            R1 = rotation_matrices(w[0], q1)
+            c23 = np.einsum("nji,nj->ni", R1, c - p[0]) + p[0]  # Wrist center with a1 undone
+            C23 = self._plane(c23)
+
+            # a2/a3: planar two-link problem
+            D_sq = np.sum((C23 - P2)**2, axis=1)
+            cos_gamma = (D_sq - L2**2 - L3**2) / (2 * L2 * L3)
+            elbow_valid = np.abs(cos_gamma) <= 1
+            for j, gamma in enumerate([np.arccos(np.clip(cos_gamma, -1, 1)), -np.arccos(np.clip(cos_gamma, -1, 1))]):
+                q3 = gamma - phi0
+                C_q3 = P3 + np.stack((np.cos(q3) * (C0 - P3)[0] - np.sin(q3) * (C0 - P3)[1],
+                                      np.sin(q3) * (C0 - P3)[0] + np.cos(q3) * (C0 - P3)[1]), axis=-1)
+                q2 = np.arctan2((C23 - P2)[:, 1], (C23 - P2)[:, 0]) - np.arctan2((C_q3 - P2)[:, 1], (C_q3 - P2)[:, 0])
+
+                # a4/a5/a6: ZYZ decomposition of the remaining wrist rotation
+                R123 = R1 @ rotation_matrices(w[1], q2) @ rotation_matrices(w[2], q3)
+                M = self.B.T @ np.transpose(R123, (0, 2, 1)) @ R_t @ self.R_WE0.T @ self.B
+                sin_b = np.sqrt(M[:, 0, 2]**2 + M[:, 1, 2]**2)
+                for k, sign in enumerate([1, -1]):
+                    q5 = np.arctan2(sign * sin_b, M[:, 2, 2])
+                    q4 = np.arctan2(sign * M[:, 1, 2], sign * M[:, 0, 2])
+                    q6 = np.arctan2(sign * M[:, 2, 1], -sign * M[:, 2, 0])
+                    singular = sin_b < 1e-9  # Only q4 + q6 is determined
+                    q4 = np.where(singular, 0, q4)
+                    q6 = np.where(singular, np.arctan2(M[:, 1, 0], M[:, 1, 1]), q6)
+
+                    b = 4*i + 2*j + k
+                    solutions[:, b] = np.stack((q1, q2, q3, q4, q5, self.a6_sign * q6), axis=-1)
+                    valid[:, b] = base_valid & elbow_valid
+
+        # Wrap into the joint limits where possible
+        solutions = (solutions + np.pi) % (2 * np.pi) - np.pi
+        solutions = np.where(solutions < self.lower_limits, solutions + 2 * np.pi, solutions)
+        solutions = np.where(solutions > self.upper_limits, solutions - 2 * np.pi, solutions)
+        valid &= np.all((solutions >= self.lower_limits) & (solutions <= self.upper_limits), axis=2)
+
+        # Reorder into plant position order
+        q = np.zeros_like(solutions)
+        q[:, :, self.position_indices] = solutions
+        return q, valid
+
+
+    def pose_error(self, q, pose):
+        """
+        Returns the 6D (rotation, translation) error of the end effector pose at
+        q with respect to pose, in world.
+        """
+        self.plant.SetPositions(self.plant_context, q)
+        X_WE = self.eef_frame.CalcPoseInWorld(self.plant_context)
+        R_err = pose.rotation() @ X_WE.rotation().inverse()
+        angle_axis = R_err.ToAngleAxis()
+        return np.concatenate((angle_axis.angle() * angle_axis.axis(), pose.translation() - X_WE.translation()))
+
+
+    def polish(self, q, pose, iterations=3, tol=1e-9):
+        """
+        Gauss-Newton steps on the plant's forward kinematics (corrects for the
+        wrist not being exactly spherical). Returns the polished q and its
+        final error norm.
+        """
+        for _ in range(iterations):
+            error = self.pose_error(q, pose)
+            if np.linalg.norm(error) < tol:
+                break
+            J = self.plant.CalcJacobianSpatialVelocity(self.plant_context, JacobianWrtVariable.kQDot, self.eef_frame,
+                                                       np.zeros(3), self.plant.world_frame(), self.plant.world_frame())
+            q = q + np.linalg.lstsq(J, error, rcond=None)[0]
+        return q, np.linalg.norm(self.pose_error(q, pose))
+
+
+    def solve(self, pose, polish=True, tol=1e-6):
+        """
+        Returns a (B, 6) np array of every valid solution branch for a single
+        pose (B may be 0, i.e. if the pose is unreachable or singular).
+        """
+        solutions, valid = self.solve_batch([pose])
+        solutions = solutions[0][valid[0]]
+        if not polish:
+            return solutions
+        polished = []
+        for q in solutions:
+            q, error = self.polish(q, pose)
+            if error < tol and np.all((q >= self.plant.GetPositionLowerLimits()) & (q <= self.plant.GetPositionUpperLimits())):
+                polished.append(q)
+        return np.array(polished).reshape(-1, 6)
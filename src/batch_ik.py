@@ -0,0 +1,126 @@
+"""
+Batch IK: solve IK for many target poses (i.e. every pre-pick pose candidate
+for a whole wall of boxes) in a worker pool, with a plant context and
+IKService per worker, in one round trip.
+
+Poses are passed to the workers as 4x4 np arrays and regions as (A, b) np
+arrays (in-process solves use the caller's HPolyhedrons directly).
+"""
+from pydrake.all import (
+    HPolyhedron,
+    RigidTransform,
+)
+
+import numpy as np
+import threading
+import time
+
+from scene_factory import get_scene_factory
+from parallelism import get_parallelism
+from ik_service import get_ik_service
+from utils import SuppressOutput
+
+
+### Worker state; each worker (process or thread) builds its own IK plant context once
+_worker_state = threading.local()
+
+
+def _init_ik_worker():
+    _worker_state.plant, _worker_state.plant_context = get_scene_factory().ik_plant()
+
+
+def _ik_worker(poses, regions, ik_kwargs, quiet, plant=None, plant_context=None):
+    """
+    Solve IK for a chunk of poses (with the worker's plant context, unless
+    plant and plant_context are given). regions maps names to HPolyhedrons, or
+    (in pool workers) to (A, b) np arrays. Returns an (N, num_positions) np
+    array of solutions and an (N,) boolean np array of which solves succeeded.
+    """
+    if plant is None:
+        if not hasattr(_worker_state, "plant"):
+            _init_ik_worker()
+        plant, plant_context = _worker_state.plant, _worker_state.plant_context
+    ik_service = get_ik_service(plant, plant_context)
+    if regions is not None:
+        regions = {name: r if isinstance(r, HPolyhedron) else HPolyhedron(*r) for name, r in regions.items()}
+
+    qs = np.zeros((len(poses), plant.num_positions()))
+    successes = np.zeros(len(poses), dtype=bool)
+    for i, X in enumerate(poses):
+        pose = RigidTransform(X)
+        if quiet:
+            with SuppressOutput():  # IK prints on every solve
+                qs[i], successes[i] = ik_service.solve(pose, regions=regions, **ik_kwargs)
+        else:
+            qs[i], successes[i] = ik_service.solve(pose, regions=regions, **ik_kwargs)
+    return qs, successes
+
+
+class BatchIK():
+    """
+    Solves IK for lists of poses, in-process or in a worker pool (see
+    parallelism.py). The pool is created lazily and kept alive across calls,
+    so the cost of building a plant in each worker is only paid once.
+    """
+    def __init__(self, num_workers=1, backend=None, quiet=False, verbose=False, plant=None, plant_context=None):
+        """
+        num_workers is 1 by default, which solves serially in-process (with
+        plant and plant_context, if given, otherwise with the scene factory's
+        IK plant); None uses the shared parallelism setting.
+
+        backend ("processes" or "threads") of the worker pool defaults to the
+        shared parallelism setting. Process pools should only be started from
+        offline batch scripts, not from inside a running simulation (forking
+        would copy its Drake and Meshcat server threads).
+
+        quiet suppresses the per-solve IK output in the workers (only use it
+        with the "processes" backend, since it redirects the file descriptors
+        of the whole process).
+
+        verbose prints a summary (success count and time) after every solve()
+        call; it is off by default since online callers solve once per
+        candidate.
+        """
+        self.num_workers = num_workers if num_workers is not None else get_parallelism().num_workers
+        self.backend = backend if backend is not None else get_parallelism().backend
+        self.quiet = quiet
+        self.verbose = verbose
+        self.plant = plant
+        self.plant_context = plant_context
+        self.executor = None
+
+
+    def solve(self, poses, regions=None, translation_error=0, rotation_error=0.05, pose_as_constraint=True, num_regions_to_try=5, project_onto_regions=False):
+        """
+        poses is a list of RigidTransforms or 4x4 np arrays (or an (N, 4, 4)
+        np array); the remaining arguments are the same as utils.ik().
+
+        Returns an (N, num_positions) np array of solutions and an (N,) boolean
+        np array of which solves succeeded (both in input order).
+        """
+        start = time.time()
+        poses = [X if isinstance(X, np.ndarray) else X.GetAsMatrix4() for X in poses]
+        ik_kwargs = dict(translation_error=translation_error, rotation_error=rotation_error, pose_as_constraint=pose_as_constraint,
+                         num_regions_to_try=num_regions_to_try, project_onto_regions=project_onto_regions)
+
+        if self.num_workers <= 1 or len(poses) <= 1:
+            qs, successes = _ik_worker(poses, regions, ik_kwargs, self.quiet, self.plant, self.plant_context)  # The caller's HPolyhedrons, as is
+        else:
+            region_Abs = {name: (r.A(), r.b()) for name, r in regions.items()} if regions is not None else None
+            if self.executor is None:
+                self.executor = get_parallelism().make_executor(initializer=_init_ik_worker, max_workers=self.num_workers, backend=self.backend)
+            chunks = np.array_split(np.arange(len(poses)), self.num_workers)
+            futures = [self.executor.submit(_ik_worker, [poses[i] for i in c], region_Abs, ik_kwargs, self.quiet) for c in chunks if len(c) > 0]
+            results = [f.result() for f in futures]  # Preserve input order
+            qs = np.vstack([r[0] for r in results])
+            successes = np.concatenate([r[1] for r in results])
+
+        if self.verbose:
+            print(f"BatchIK: {np.sum(successes)}/{len(poses)} IK solves succeeded in {time.time() - start:.2f}s.")
+        return qs, successes
+
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,19 @@
+"""
+Offline precompute of the IK seed table (see ik_seeds.py) for the scene's IK
+plant. Run this once (and again whenever the arm's kinematics change); IK
+warm starts are skipped until the table exists.
+"""
+import argparse
+
+from scene_factory import get_scene_factory
+from ik_seeds import IKSeedTable, SEED_TABLE_FILE, save_ik_seed_table
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--file', default=SEED_TABLE_FILE, help="pickle file to save the table to.")
+parser.add_argument('--num_samples', type=int, default=20000, help="number of configurations to sample.")
+args = parser.parse_args()
+
+plant, _ = get_scene_factory().ik_plant()
+table = IKSeedTable.build(plant, args.num_samples)
+save_ik_seed_table(plant, table, args.file)
+print(f"IKSeedTable: saved to {args.file}.")
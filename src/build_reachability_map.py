@@ -0,0 +1,27 @@
+"""
+Offline precompute of the grasp reachability map (see reachability_map.py) for
+a set of IRIS source regions. Run this before enabling use_reachability_map in
+MotionPlanner; the map is saved next to the regions file, along with its grid
+(so MotionPlanner uses whatever --resolution it was built with).
+"""
+from pydrake.all import (
+    LoadIrisRegionsYamlFile,
+)
+
+from pathlib import Path
+import argparse
+
+from parallelism import get_parallelism
+from batch_ik import BatchIK
+from reachability_map import ReachabilityMap
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--regions_file', default="../data/iris_source_regions.yaml", help="IRIS source regions YAML file the map is built for.")
+parser.add_argument('--resolution', type=float, default=0.25, help="voxel size (in m).")
+args = parser.parse_args()
+
+regions_file = Path(args.regions_file)
+regions = LoadIrisRegionsYamlFile(regions_file)
+batch_ik = BatchIK(num_workers=None, quiet=get_parallelism().backend == "processes", verbose=True)  # Offline, so a process pool is fine
+ReachabilityMap.load_or_build(regions_file.parent / "reachability_map.pkl", batch_ik, regions, [regions_file], resolution=args.resolution)
+batch_ik.close()
@@ -0,0 +1,104 @@
+"""
+Clique-cover region generation from caller-chosen seed points.
+
+IrisInConfigurationSpaceFromCliqueCover() always draws its visibility graph
+points uniformly from the whole domain. This module runs the same pipeline
+(visibility graph --> greedy clique cover --> FastIRIS from each clique's
+circumscribed ellipsoid) on points that the caller picks, so that seeding can
+be directed at e.g. uncovered parts of configuration space or the truck
+trailer workspace.
+"""
+from pydrake.all import (
+    HPolyhedron,
+    Hyperellipsoid,
+    FastIris,
+    MaxCliqueSolverViaGreedy,
+    VisibilityGraph,
+)
+
+import numpy as np
+import time
+
+from edge_cache import build_visibility_graph
+
+
+def clique_cover(adjacency, minimum_clique_size, max_num_cliques=None):
+    """
+    Greedily cover a graph with cliques: repeatedly find a max clique and remove
+    its vertices, until the largest remaining clique is smaller than
+    minimum_clique_size.
+
+    adjacency is a symmetric scipy.sparse boolean matrix.
+
+    Returns a list of np arrays of vertex indices, one per clique.
+    """
+    solver = MaxCliqueSolverViaGreedy()
+    remaining = np.arange(adjacency.shape[0])
+    adjacency = adjacency.tocsc()
+    cliques = []
+    while len(remaining) >= minimum_clique_size:
+        if max_num_cliques is not None and len(cliques) >= max_num_cliques:
+            break
+        sub_adjacency = adjacency[remaining, :][:, remaining].tocsc()
+        in_clique = np.asarray(solver.SolveMaxClique(sub_adjacency)).flatten().astype(bool)
+        if np.count_nonzero(in_clique) < minimum_clique_size:
+            break
+        cliques.append(remaining[in_clique])
+        remaining = remaining[~in_clique]
+    return cliques
+
+
+def regions_from_points(collision_checker, points, options, domain=None, max_num_cliques=None, edge_store=None, scene_fingerprint=None):
+    """
+    Build regions from a given set of seed points.
+
+    collision_checker is the (ConfigurationSpaceObstacle)CollisionChecker used
+    for the visibility graph and for FastIRIS.
+
+    points is a cspace_dim x N np array of collision-free configurations.
+
+    options is an IrisFromCliqueCoverOptions; minimum_clique_size,
+    fast_iris_options, parallelism and
+    rank_tol_for_minimum_volume_circumscribed_ellipsoid are used.
+
+    domain defaults to the plant's joint limits.
+
+    edge_store is an optional EdgeResultStore (with the scene_fingerprint of
+    collision_checker's current scene) so that a visibility graph built over
+    the same points in an earlier run is reused.
+
+    Returns a list of new HPolyhedrons.
+    """
+    plant = collision_checker.plant()
+    if domain is None:
+        domain = HPolyhedron.MakeBox(plant.GetPositionLowerLimits(), plant.GetPositionUpperLimits())
+
+    start = time.time()
+    if edge_store is not None:
+        visibility_graph = build_visibility_graph(collision_checker, points, edge_store, scene_fingerprint, options.parallelism)
+        edge_store.save()
+    else:
+        visibility_graph = VisibilityGraph(collision_checker, points, options.parallelism)
+    print(f"regions_from_points: visibility graph over {points.shape[1]} points built in {time.time() - start:.2f}s.")
+
+    cliques = clique_cover(visibility_graph, options.minimum_clique_size, max_num_cliques=max_num_cliques)
+    print(f"regions_from_points: found {len(cliques)} cliques of size >= {options.minimum_clique_size}.")
+
+    regions = []
+    for clique in cliques:
+        clique_points = points[:, clique]
+        try:
+            clique_ellipse = Hyperellipsoid.MinimumVolumeCircumscribedEllipsoid(clique_points, options.rank_tol_for_minimum_volume_circumscribed_ellipsoid)
+        except RuntimeError:
+            # Clique points are (nearly) degenerate; fall back to a tiny sphere at their mean like in generate_source_region_at_q_nominal()
+            kEpsilonEllipsoid = 1e-5
+            clique_ellipse = Hyperellipsoid.MakeHypersphere(kEpsilonEllipsoid, np.mean(clique_points, axis=1))
+
+        # FastIRIS needs a collision-free seed; if the ellipse center isn't, re-center on the closest clique point
+        if not collision_checker.CheckConfigCollisionFree(clique_ellipse.center()):
+            closest = np.argmin(np.linalg.norm(clique_points - clique_ellipse.center()[:, np.newaxis], axis=0))
+            clique_ellipse = Hyperellipsoid(clique_ellipse.A(), clique_points[:, closest])
+
+        regions.append(FastIris(collision_checker, clique_ellipse, domain, options.fast_iris_options))
+
+    return regions
@@ -26,6 +26,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from station import MakeHardwareStation, load_scenario
 from scenario import scenario_yaml_for_iris
 from utils import ik
+from collision_cache import CachedCollisionChecker
+from edge_cache import EdgeResultStore, build_visibility_graph, scene_fingerprint
+from parallelism import get_parallelism
 
 import numpy as np
 import importlib
@@ -77,8 +80,10 @@ collision_checker_params = {}
 collision_checker_params["robot_model_instances"] = robot_model_instances
 collision_checker_params["model"] = diagram
 collision_checker_params["edge_step_size"] = 0.125
+get_parallelism().apply_to_checker_params(collision_checker_params)
 collision_checker = SceneGraphCollisionChecker(**collision_checker_params)
 config_obstacle_collision_checker = ConfigurationSpaceObstacleCollisionChecker(collision_checker, [])
+cached_collision_checker = CachedCollisionChecker(config_obstacle_collision_checker)
 
 rng = RandomGenerator(1234)
 
@@ -91,7 +96,7 @@ for i in range(np.shape(points)[1]):
     quaternion_sample = Quaternion(quaternion_sample[3], quaternion_sample[0], quaternion_sample[1], quaternion_sample[2])
     q, ik_success = ik(plant, plant_context, RigidTransform(quaternion_sample, last_polytope_sample), translation_error=0, rotation_error=0.05)
 
-    while not ik_success or not config_obstacle_collision_checker.CheckConfigCollisionFree(q):
+    while not ik_success or not cached_collision_checker.CheckConfigCollisionFree(q):
         last_polytope_sample = hpoly.UniformSample(rng, last_polytope_sample)
         quaternion_sample = Rotation.random().as_quat()  # [x, y, z, w] order
         quaternion_sample = Quaternion(quaternion_sample[3], quaternion_sample[0], quaternion_sample[1], quaternion_sample[2])
@@ -100,6 +105,7 @@ for i in range(np.shape(points)[1]):
     points_3d[:,i] = last_polytope_sample
     points[:,i] = q
 
+cached_collision_checker.print_stats()
 
 # Display convex hull of sampling region
 from scipy.spatial import ConvexHull
@@ -118,7 +124,10 @@ pc = PointCloud(NUM_SAMPLES)
 pc.mutable_xyzs()[:] = points_3d
 meshcat.SetObject(f"samples", pc, point_size=0.05, rgba=Rgba(r=0.5, g=0.1, b=0.1, a=0.5))
 
-visibility_graph = VisibilityGraph(config_obstacle_collision_checker, points)
+edge_store = EdgeResultStore(os.path.dirname(os.path.abspath(__file__)) + f"/../../data/visibility_graph_edges_{TEST_SCENE}.pkl")
+visibility_graph = build_visibility_graph(config_obstacle_collision_checker, points, edge_store, scene_fingerprint(collision_checker, scenario_yaml_for_iris if TEST_SCENE == "BOXUNLOADING" else scene_yaml_file))
+edge_store.print_stats()
+edge_store.save()
 
 row_indices, col_indices, _ = find(visibility_graph)
     
@@ -0,0 +1,184 @@
+"""
+Caching wrapper around SceneGraphCollisionChecker /
+ConfigurationSpaceObstacleCollisionChecker for configuration collision checks.
+
+The same configurations get checked over and over (q_nominal seeds, coverage
+samples drawn with fixed seeds, IK results that are re-checked, PRM points).
+This keeps a bounded LRU cache keyed on the quantized configuration plus a
+scene version, so repeated queries skip SceneGraph entirely.
+"""
+from collections import OrderedDict
+import hashlib
+import numpy as np
+
+from parallelism import get_parallelism
+
+
+def obstacles_fingerprint(obstacles):
+    """
+    Content hash of a list of configuration-space obstacles (HPolyhedrons or
+    other ConvexSets; sets without an A()/b() are hashed by identity).
+    """
+    fingerprint = hashlib.sha1()
+    for obstacle in obstacles:
+        if hasattr(obstacle, "A") and hasattr(obstacle, "b"):
+            fingerprint.update(np.ascontiguousarray(obstacle.A()).tobytes())
+            fingerprint.update(np.ascontiguousarray(obstacle.b()).tobytes())
+        else:
+            fingerprint.update(str(id(obstacle)).encode())
+    return fingerprint.hexdigest()
+
+
+class CachedCollisionChecker():
+    """
+    Drop-in replacement for a CollisionChecker in Python code paths. Calls to
+    CheckConfigCollisionFree() and CheckConfigsCollisionFree() are cached; any
+    other method call is forwarded to the wrapped checker.
+
+    Note that Drake C++ functions (FastIris, VisibilityGraph, PRM,
+    IrisInConfigurationSpaceFromCliqueCover, ...) need the wrapped checker
+    itself (see `checker`); the cache only speeds up Python-side queries.
+
+    The scene version changes whenever the configuration-space obstacles are
+    set to something different or the collision filters/padding/shapes are
+    modified through this wrapper, so stale results are never returned. If the
+    scene is modified some other way, call invalidate().
+    """
+    # Methods of the wrapped checker that change collision results
+    _MUTATING_METHODS = {
+        "SetCollisionFilteredBetween",
+        "SetCollisionFilteredWithAllBodies",
+        "SetCollisionFilterMatrix",
+        "SetPaddingBetween",
+        "SetPaddingMatrix",
+        "SetPaddingAllRobotEnvironmentPairs",
+        "SetPaddingAllRobotRobotPairs",
+        "SetPaddingOneRobotBodyAllEnvironmentPairs",
+        "AddCollisionShape",
+        "AddCollisionShapes",
+        "AddCollisionShapeToBody",
+        "AddCollisionShapeToFrame",
+        "RemoveAllAddedCollisionShapes",
+    }
+
+    def __init__(self, collision_checker, resolution=1e-6, max_size=100000):
+        """
+        resolution is the quantization step (in radians) used to build cache
+        keys; configurations that round to the same grid point share a result.
+
+        max_size is the maximum number of cached configurations.
+        """
+        self.checker = collision_checker
+        self.resolution = resolution
+        self.max_size = max_size
+
+        self.cache = OrderedDict()  # Maps (scene version, quantized q bytes) to bool
+        self.num_mutations = 0
+        self.obstacles_fingerprint = None
+        self.hits = 0
+        self.misses = 0
+
+
+    def scene_version(self):
+        return (self.num_mutations, self.obstacles_fingerprint)
+
+
+    def invalidate(self):
+        """
+        Mark all cached results as stale (i.e. after the scene was modified
+        without going through this wrapper).
+        """
+        self.num_mutations += 1
+
+
+    def _key(self, q):
+        quantized = np.round(np.asarray(q, dtype=float) / self.resolution).astype(np.int64)
+        return (self.scene_version(), quantized.tobytes())
+
+
+    def _store(self, key, value):
+        self.cache[key] = value
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)  # Evict least recently used
+
+
+    def CheckConfigCollisionFree(self, q):
+        key = self._key(q)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        value = self.checker.CheckConfigCollisionFree(q)
+        self._store(key, value)
+        return value
+
+
+    def CheckConfigsCollisionFree(self, configs, parallelize=None):
+        """
+        Batched version; only the cache misses are sent to the wrapped checker
+        (in a single, parallelized query).
+
+        parallelize defaults to the shared parallelism setting.
+        """
+        if parallelize is None:
+            parallelize = get_parallelism().drake_parallelism()
+        keys = [self._key(q) for q in configs]
+        results = [None] * len(keys)
+        miss_idxs = []
+        for i, key in enumerate(keys):
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                results[i] = self.cache[key]
+            else:
+                miss_idxs.append(i)
+
+        if miss_idxs:
+            self.misses += len(miss_idxs)
+            miss_results = self.checker.CheckConfigsCollisionFree([configs[i] for i in miss_idxs], parallelize)
+            for i, value in zip(miss_idxs, miss_results):
+                results[i] = bool(value)
+                self._store(keys[i], results[i])
+
+        return results
+
+
+    def _set_configuration_space_obstacles(self, obstacles):
+        """
+        SetConfigurationSpaceObstacles() of the wrapped
+        ConfigurationSpaceObstacleCollisionChecker (only exposed if the wrapped
+        checker has it; see __getattr__()). The scene version is derived from
+        the obstacles' contents, so setting the same obstacles again (i.e. []
+        before every coverage estimate) keeps the cached results valid.
+        """
+        self.checker.SetConfigurationSpaceObstacles(obstacles)
+        self.obstacles_fingerprint = obstacles_fingerprint(obstacles)
+
+
+    def stats(self):
+        num_queries = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / num_queries if num_queries > 0 else 0.0,
+            "size": len(self.cache),
+        }
+
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"CachedCollisionChecker: {s['hits']} hits, {s['misses']} misses (hit rate {s['hit_rate']:.2%}); {s['size']} cached configurations.")
+
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined on this class; forward to the wrapped checker
+        attr = getattr(self.checker, name)  # Raises AttributeError (so hasattr() is False) if the wrapped checker lacks it
+        if name == "SetConfigurationSpaceObstacles":
+            return self._set_configuration_space_obstacles
+        if name in CachedCollisionChecker._MUTATING_METHODS:
+            def mutating_method(*args, **kwargs):
+                self.invalidate()
+                return attr(*args, **kwargs)
+            return mutating_method
+        return attr
@@ -0,0 +1,92 @@
+"""
+Utilities for measuring how much of collision-free configuration space is
+covered by a set of IRIS regions, using a fixed, reusable bank of samples.
+"""
+from pydrake.all import (
+    HPolyhedron,
+    RandomGenerator,
+)
+
+import numpy as np
+import time
+
+from parallelism import get_parallelism
+
+
+def region_membership(regions, points, tol=1e-9):
+    """
+    Vectorized point-in-set test of many points against many HPolyhedrons.
+
+    regions is a list of HPolyhedrons.
+
+    points is an N x cspace_dim np array.
+
+    Returns a (num regions) x N boolean np array whose (i, j) entry is True if
+    points[j] lies in regions[i].
+    """
+    points = np.atleast_2d(points)
+    membership = np.zeros((len(regions), points.shape[0]), dtype=bool)
+    for i, r in enumerate(regions):
+        membership[i] = np.all(r.A() @ points.T <= r.b()[:, np.newaxis] + tol, axis=0)
+    return membership
+
+
+class SampleBank():
+    """
+    Fixed bank of uniform samples over the plant's joint limits, along with
+    whether each sample is collision-free. Because the same samples are reused,
+    coverage numbers computed from one bank are directly comparable between
+    rounds of region generation (unlike IrisRegionGenerator.estimate_coverage(),
+    which is also ~100x slower since it collision-checks and PointInSet-checks
+    one sample at a time).
+    """
+    def __init__(self, collision_checker, num_samples=10000, seed=42):
+        self.collision_checker = collision_checker
+        plant = collision_checker.plant()
+
+        rng = RandomGenerator(seed)
+        sampling_domain = HPolyhedron.MakeBox(plant.GetPositionLowerLimits(), plant.GetPositionUpperLimits())
+        last_sample = sampling_domain.UniformSample(rng)
+
+        samples = np.zeros((num_samples, plant.num_positions()))
+        for i in range(num_samples):
+            last_sample = sampling_domain.UniformSample(rng, last_sample)
+            samples[i] = last_sample
+
+        if hasattr(collision_checker, "SetConfigurationSpaceObstacles"):
+            collision_checker.SetConfigurationSpaceObstacles([])  # We don't want to account for any c-space obstacles in the bank
+
+        start = time.time()
+        collision_free = collision_checker.CheckConfigsCollisionFree(list(samples), get_parallelism().drake_parallelism())  # Batched; runs in parallel across the checker's contexts
+        print(f"SampleBank: collision-checked {num_samples} samples in {time.time() - start:.2f}s.")
+
+        self.samples = samples  # N x cspace_dim
+        self.collision_free = np.array(collision_free, dtype=bool)  # (N,)
+        self.free_samples = samples[self.collision_free]  # M x cspace_dim
+
+
+    def membership(self, regions):
+        """
+        Returns a (num regions) x M boolean np array of which collision-free
+        samples fall in each region.
+        """
+        return region_membership(regions, self.free_samples)
+
+
+    def covered_mask(self, regions):
+        """
+        Returns an (M,) boolean np array of which collision-free samples fall
+        in at least one region.
+        """
+        if len(regions) == 0:
+            return np.zeros(self.free_samples.shape[0], dtype=bool)
+        return np.any(self.membership(regions), axis=0)
+
+
+    def coverage(self, regions):
+        """
+        Fraction of collision-free samples that fall in at least one region.
+        """
+        if self.free_samples.shape[0] == 0:
+            return 0.0
+        return float(np.mean(self.covered_mask(regions)))
@@ -2,11 +2,14 @@ from pydrake.all import (
     LeafSystem,
     AbstractValue,
     RigidTransform,
+    StartMeshcat,
 )
+from manipulation.meshcat_utils import AddMeshcatTriad
 
 from scenario import NUM_BOXES
 
 import numpy as np
+import time
 
 class Debugger(LeafSystem):
     """
@@ -39,4 +42,113 @@ class Debugger(LeafSystem):
         if self.on:
             print(f"q_current: {q_current}")
             print(f"q_dot_current: {q_dot_current}")
-            print(f"kuka_actuation: {kuka_actuation}")
\ No newline at end of file
+            print(f"kuka_actuation: {kuka_actuation}")
+
+
+class DebugVisualizer():
+    """
+    Reusable, throttled Meshcat debug drawing.
+
+    Draw calls are queued and only sent to Meshcat on flush(), so a Delete of a
+    path drops any queued updates below it, paths that were never drawn aren't
+    deleted, and transforms that haven't changed aren't re-sent. Drawing can be
+    rate-limited per named frame (see should_draw()) or disabled entirely, in
+    which case every method returns immediately and no Meshcat is started.
+    """
+    def __init__(self, meshcat=None, enabled=True, min_period=0.0, setup=None):
+        """
+        meshcat is an optional existing Meshcat instance; otherwise one is
+        started on first use (only once), and setup (a function taking the
+        Meshcat instance) is called on it, i.e. to set a 2D render mode.
+
+        min_period is the minimum wall clock time (in s) between two draws of
+        the same frame.
+        """
+        self.meshcat = meshcat
+        self.enabled = enabled
+        self.min_period = min_period
+        self.setup = setup
+
+        self.last_draw_times = {}  # Maps frame name to wall clock time of its last draw
+        self.queue = []  # List of (path, function) tuples to run on flush()
+        self.drawn_paths = set()  # Paths drawn (and not deleted) so far
+        self.transforms = {}  # Maps path to the last 4x4 transform sent
+
+
+    def get_meshcat(self):
+        if self.meshcat is None:
+            self.meshcat = StartMeshcat()
+            if self.setup is not None:
+                self.setup(self.meshcat)
+        return self.meshcat
+
+
+    def should_draw(self, frame):
+        """
+        Whether the named frame (i.e. "pick_poses") should be drawn now; if
+        so, its draw time is recorded. Callers should skip computing what they
+        would draw if this returns False.
+        """
+        if not self.enabled:
+            return False
+        now = time.time()
+        if now - self.last_draw_times.get(frame, -np.inf) < self.min_period:
+            return False
+        self.last_draw_times[frame] = now
+        return True
+
+
+    def _add(self, path, function):
+        self.queue.append((path, function))
+        self.drawn_paths.add(path)
+
+
+    def set_object(self, path, shape, rgba):
+        if self.enabled:
+            self._add(path, lambda meshcat: meshcat.SetObject(path, shape, rgba))
+
+
+    def set_transform(self, path, X):
+        if not self.enabled:
+            return
+        X = X.GetAsMatrix4()
+        if path in self.transforms and np.array_equal(self.transforms[path], X):
+            return
+        self.transforms[path] = X
+        self._add(path, lambda meshcat: meshcat.SetTransform(path, RigidTransform(X)))
+
+
+    def set_line(self, path, vertices, line_width, rgba):
+        if self.enabled:
+            self._add(path, lambda meshcat: meshcat.SetLine(path, vertices, line_width, rgba))
+
+
+    def add_triad(self, path, X, opacity=1.0):
+        if self.enabled:
+            self._add(path, lambda meshcat: AddMeshcatTriad(meshcat, path, X_PT=X, opacity=opacity))
+
+
+    def delete(self, path):
+        """
+        Delete path and everything below it.
+        """
+        if not self.enabled:
+            return
+        below = lambda p: p == path or p.startswith(path + "/")
+        self.queue = [(p, function) for p, function in self.queue if not below(p)]
+        if any(below(p) for p in self.drawn_paths):
+            self.queue.append((path, lambda meshcat: meshcat.Delete(path)))
+            self.drawn_paths = {p for p in self.drawn_paths if not below(p)}
+            self.transforms = {p: X for p, X in self.transforms.items() if not below(p)}
+
+
+    def flush(self):
+        """
+        Send every queued update to Meshcat.
+        """
+        if not self.queue:
+            return
+        meshcat = self.get_meshcat()
+        for _, function in self.queue:
+            function(meshcat)
+        self.queue = []
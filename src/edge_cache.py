@@ -0,0 +1,260 @@
+"""
+Persistent store of straight-line edge collision-check results, plus visibility
+graph and PRM builders that use it.
+
+Visibility graphs are cached together with the IDs of their samples (a hash
+of each quantized configuration) under a scene fingerprint. Rebuilding a graph
+over a sample set that overlaps a cached one (i.e. an extended or reordered
+set) reuses the cached block between the shared samples, builds the block
+between the new samples with Drake's VisibilityGraph, and only batch-checks
+the pairs between new and shared samples. Only the max_graphs most recently
+used graphs are kept.
+
+PRM edges (only pairs within a radius) are cached individually, keyed by the
+IDs of their two endpoint samples (a hash of the quantized configuration), so
+rebuilding a roadmap over an extended sample set only checks new pairs.
+"""
+from pydrake.all import VisibilityGraph
+
+from collections import OrderedDict
+from scipy.sparse import csc_matrix
+from scipy.spatial import cKDTree
+from pathlib import Path
+import hashlib
+import numpy as np
+import os
+import pickle
+import time
+
+from collision_cache import obstacles_fingerprint
+from parallelism import get_parallelism
+
+
+def sample_ids(points, resolution=1e-6):
+    """
+    Stable IDs for configurations: a hash of each quantized configuration.
+
+    points is a cspace_dim x N np array.
+
+    Returns a list of N strings.
+    """
+    quantized = np.round(np.asarray(points, dtype=float).T / resolution).astype(np.int64)
+    return [hashlib.sha1(q.tobytes()).hexdigest()[:16] for q in quantized]
+
+
+def scene_fingerprint(collision_checker, scene_description, configuration_obstacles=()):
+    """
+    Fingerprint of everything that determines edge collision-check results.
+
+    scene_description must identify the collision geometry, i.e. the
+    scenario YAML string the checker's diagram was built from (so different
+    scenes never share results).
+
+    configuration_obstacles are any configuration-space obstacles set on a
+    ConfigurationSpaceObstacleCollisionChecker.
+    """
+    if not scene_description:
+        raise ValueError("scene_fingerprint() requires a scene_description.")
+    fingerprint = hashlib.sha1()
+    fingerprint.update(scene_description.encode())
+    fingerprint.update(str(collision_checker.edge_step_size()).encode())
+    fingerprint.update(obstacles_fingerprint(configuration_obstacles).encode())
+    return fingerprint.hexdigest()
+
+
+class EdgeResultStore():
+    """
+    Maps (scene fingerprint, sample ID, sample ID) to whether the straight-line
+    edge between the two samples is collision-free, and (scene fingerprint,
+    sample set fingerprint) to a whole visibility graph. Optionally backed by
+    a pickle file.
+    """
+    FORMAT_VERSION = 2
+
+    def __init__(self, file=None, max_graphs=8):
+        """
+        max_graphs is the maximum number of visibility graphs kept (least
+        recently used ones are evicted).
+        """
+        self.file = Path(file) if file is not None else None
+        self.max_graphs = max_graphs
+        self.results = {}  # Maps scene fingerprint to dict mapping (ID, ID) to bool
+        self.graphs = OrderedDict()  # Maps (scene fingerprint, sample set hash) to (np array of sample IDs, csc_matrix)
+        if self.file is not None and self.file.exists():
+            with open(self.file, "rb") as f:
+                saved = pickle.load(f)
+            if saved.get("version") == EdgeResultStore.FORMAT_VERSION:
+                self.results = saved["edges"]
+                self.graphs = saved["graphs"]
+
+        self.hits = 0
+        self.misses = 0
+
+
+    @staticmethod
+    def _key(id1, id2):
+        return (id1, id2) if id1 <= id2 else (id2, id1)  # Edges are symmetric
+
+
+    def get(self, fingerprint, id1, id2):
+        return self.results.get(fingerprint, {}).get(EdgeResultStore._key(id1, id2))
+
+
+    def put(self, fingerprint, id1, id2, collision_free):
+        self.results.setdefault(fingerprint, {})[EdgeResultStore._key(id1, id2)] = collision_free
+
+
+    def get_graph(self, fingerprint, ids):
+        """
+        The cached visibility graph over the samples with the given IDs (in
+        this order), or else the one sharing the most samples with them (or
+        None): returns a (np array of sample IDs, csc_matrix) tuple.
+        """
+        key = (fingerprint, hashlib.sha1("".join(ids).encode()).hexdigest())
+        if key in self.graphs:
+            self.graphs.move_to_end(key)
+            return self.graphs[key]
+        ids = set(ids)
+        best, best_overlap = None, 0
+        for (graph_fingerprint, _), (graph_ids, graph) in self.graphs.items():
+            overlap = len(ids.intersection(graph_ids)) if graph_fingerprint == fingerprint else 0
+            if overlap > best_overlap:
+                best, best_overlap = (graph_ids, graph), overlap
+        return best
+
+
+    def put_graph(self, fingerprint, ids, graph):
+        key = (fingerprint, hashlib.sha1("".join(ids).encode()).hexdigest())
+        self.graphs[key] = (np.array(ids), graph)
+        self.graphs.move_to_end(key)
+        while len(self.graphs) > self.max_graphs:
+            self.graphs.popitem(last=False)  # Evict least recently used
+
+
+    def save(self):
+        if self.file is None:
+            return
+        tmp_file = self.file.with_suffix(self.file.suffix + ".tmp")
+        with open(tmp_file, "wb") as f:
+            pickle.dump({"version": EdgeResultStore.FORMAT_VERSION, "edges": self.results, "graphs": self.graphs}, f)
+        os.replace(tmp_file, self.file)  # Atomic so an interrupted run can't corrupt the store
+
+
+    def print_stats(self):
+        num_queries = self.hits + self.misses
+        hit_rate = self.hits / num_queries if num_queries > 0 else 0.0
+        print(f"EdgeResultStore: {self.hits} cached edges, {self.misses} checked edges (hit rate {hit_rate:.2%}).")
+
+
+def check_edges(collision_checker, points, pairs, store, fingerprint, parallelize=None):
+    """
+    Collision-check the edges between points[:, i] and points[:, j] for every
+    (i, j) in pairs, using the store for previously checked edges. Only the new
+    edges are checked (in a single batched, parallel query).
+
+    parallelize defaults to the shared parallelism setting.
+
+    Returns an (len(pairs),) boolean np array.
+    """
+    if parallelize is None:
+        parallelize = get_parallelism().drake_parallelism()
+    ids = sample_ids(points)
+    results = np.zeros(len(pairs), dtype=bool)
+    unchecked = []
+    for k, (i, j) in enumerate(pairs):
+        cached = store.get(fingerprint, ids[i], ids[j])
+        if cached is None:
+            unchecked.append(k)
+        else:
+            results[k] = cached
+    store.hits += len(pairs) - len(unchecked)
+    store.misses += len(unchecked)
+
+    if unchecked:
+        edges = [(points[:, pairs[k][0]], points[:, pairs[k][1]]) for k in unchecked]
+        edge_results = collision_checker.CheckEdgesCollisionFree(edges, parallelize)
+        for k, collision_free in zip(unchecked, edge_results):
+            results[k] = bool(collision_free)
+            store.put(fingerprint, ids[pairs[k][0]], ids[pairs[k][1]], results[k])
+
+    return results
+
+
+def _pairs_to_adjacency(num_points, pairs, edge_free):
+    pairs = np.array(pairs, dtype=int).reshape(-1, 2)[edge_free]
+    rows = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    cols = np.concatenate((pairs[:, 1], pairs[:, 0]))
+    return csc_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(num_points, num_points))
+
+
+def build_visibility_graph(collision_checker, points, store, fingerprint, parallelize=None):
+    """
+    Equivalent to Drake's VisibilityGraph(collision_checker, points), but
+    reusing the cached graph (in store) that shares the most samples with
+    points; only pairs involving new samples are checked.
+
+    points is a cspace_dim x N np array.
+
+    parallelize defaults to the shared parallelism setting.
+
+    Returns a symmetric N x N scipy.sparse.csc_matrix of bools.
+    """
+    if parallelize is None:
+        parallelize = get_parallelism().drake_parallelism()
+    start = time.time()
+    num_points = points.shape[1]
+    ids = sample_ids(points)
+
+    # Map each sample to its index in the closest cached graph (-1 if new)
+    cached = store.get_graph(fingerprint, ids)
+    if cached is None:
+        cached_idxs = np.full(num_points, -1)
+    else:
+        cached_ids, cached_graph = cached
+        cached_index = {sample_id: k for k, sample_id in enumerate(cached_ids)}
+        cached_idxs = np.array([cached_index.get(sample_id, -1) for sample_id in ids], dtype=int)
+    shared = np.flatnonzero(cached_idxs >= 0)
+    new = np.flatnonzero(cached_idxs < 0)
+
+    rows, cols = [], []
+    if len(shared) > 0:  # Shared x shared block: reused
+        block = cached_graph[cached_idxs[shared]][:, cached_idxs[shared]].tocoo()
+        rows.append(shared[block.row])
+        cols.append(shared[block.col])
+    if len(new) > 1:  # New x new block: Drake's VisibilityGraph
+        block = VisibilityGraph(collision_checker, points[:, new], parallelize).tocoo()
+        rows.append(new[block.row])
+        cols.append(new[block.col])
+    if len(new) > 0 and len(shared) > 0:  # New x shared pairs: one batched query
+        i, j = np.repeat(new, len(shared)), np.tile(shared, len(new))
+        edge_free = np.array(collision_checker.CheckEdgesCollisionFree([(points[:, a], points[:, b]) for a, b in zip(i, j)], parallelize), dtype=bool)
+        rows += [i[edge_free], j[edge_free]]
+        cols += [j[edge_free], i[edge_free]]
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=int)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=int)
+    visibility_graph = csc_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(num_points, num_points))
+
+    num_reused = len(shared) * (len(shared) - 1) // 2
+    store.hits += num_reused
+    store.misses += num_points * (num_points - 1) // 2 - num_reused
+    store.put_graph(fingerprint, ids, visibility_graph)
+    print(f"build_visibility_graph: {num_points} points ({len(new)} new) in {time.time() - start:.2f}s.")
+    return visibility_graph
+
+
+def build_prm(collision_checker, points, radius, store, fingerprint, parallelize=None):
+    """
+    Build a PRM roadmap: an edge connects every pair of points within `radius`
+    (Euclidean distance in configuration space) whose straight-line edge is
+    collision-free. Edge results are taken from/added to store.
+
+    points is a cspace_dim x N np array.
+
+    Returns a symmetric N x N scipy.sparse.csc_matrix of bools.
+    """
+    start = time.time()
+    num_points = points.shape[1]
+    pairs = sorted(cKDTree(points.T).query_pairs(radius))
+    edge_free = check_edges(collision_checker, points, pairs, store, fingerprint, parallelize)
+    print(f"build_prm: {num_points} points, {len(pairs)} pairs within radius {radius} in {time.time() - start:.2f}s.")
+    return _pairs_to_adjacency(num_points, pairs, edge_free)
@@ -8,9 +8,6 @@ from pydrake.all import (
     RigidTransform,
     RotationMatrix,
     InverseKinematics,
-    DiagramBuilder,
-    AddMultibodyPlantSceneGraph,
-    Parser,
     Solve,
     CompositeTrajectory,
     PiecewisePolynomial,
@@ -20,12 +17,13 @@ from pydrake.all import (
 )
 from manipulation.meshcat_utils import AddMeshcatTriad
 from manipulation.scenarios import AddMultibodyTriad
-from manipulation.utils import ConfigureParser
 
-from scenario import BOX_DIM, NUM_BOXES, PREPICK_MARGIN, scenario_yaml_for_iris, q_nominal
-from utils import ik
+from scenario import BOX_DIM, NUM_BOXES, PREPICK_MARGIN, q_nominal
 from pick_planner import PickPlanner
+from ik_cache import IKCache
+from reachability_map import ReachabilityMap
 from iris import IrisRegionGenerator
+from scene_factory import get_scene_factory
 
 import time
 import numpy as np
@@ -34,7 +32,14 @@ from pathlib import Path
 
 class MotionPlanner(LeafSystem):
 
-    def __init__(self, original_plant, meshcat, robot_pose, box_randomization_runtime, regions_file, regions_place_file):
+    def __init__(self, original_plant, meshcat, robot_pose, box_randomization_runtime, regions_file, regions_place_file, scene_factory=None, use_reachability_map=False):
+        """
+        use_reachability_map enables the grasp reachability map (see
+        reachability_map.py), loaded from reachability_map.pkl next to
+        regions_file. It has to be built offline first (with
+        build_reachability_map.py); if it is missing or stale, pick pose
+        candidates are not filtered.
+        """
         LeafSystem.__init__(self)
 
         kuka_state = self.DeclareVectorInputPort(name="kuka_state", size=12)  # 6 pos, 6 vel
@@ -57,17 +62,11 @@ class MotionPlanner(LeafSystem):
             "kuka_acceleration", 6, self.output_acceleration
         )
 
-        ### Create MBP for IK and Traj. Opt.
-        builder = DiagramBuilder()
-        plant, scene_graph = AddMultibodyPlantSceneGraph(builder, time_step=0.001)
-        parser = Parser(plant)
-        ConfigureParser(parser)
-        kuka = parser.AddModelsFromString(scenario_yaml_for_iris, ".dmd.yaml")[1]  # ModelInstance object
-        
-        plant.Finalize()
-        diagram = builder.Build()
-        context = diagram.CreateDefaultContext()
-        plant_context = plant.GetMyContextFromRoot(context)
+        ### Get MBP for IK and Traj. Opt. (built once by the scene factory, so the models are only parsed once)
+        if scene_factory is None:
+            scene_factory = get_scene_factory()
+        plant, plant_context = scene_factory.ik_plant()
+        kuka = plant.GetModelInstanceByName("kuka")  # ModelInstance object
 
         # Member variables
         self.plant = plant
@@ -90,7 +89,12 @@ class MotionPlanner(LeafSystem):
             box_model_idx = original_plant.GetModelInstanceByName(f"Boxes/Box_{i}")  # ModelInstanceIndex
             box_body_idx = original_plant.GetBodyIndices(box_model_idx)[0]  # BodyIndex
             self.box_body_indices.append(box_body_idx)
-        self.pick_planner = PickPlanner(self.meshcat, self.robot_pose, self.box_body_indices, self.plant, self.plant_context)
+        self.ik_cache = IKCache(Path(regions_file).parent / "ik_cache.pkl", regions_files=[regions_file, regions_place_file])
+        self.pick_planner = PickPlanner(self.meshcat, self.robot_pose, self.box_body_indices, self.plant, self.plant_context, ik_cache=self.ik_cache)
+        if use_reachability_map:
+            self.pick_planner.reachability_map = ReachabilityMap.load(Path(regions_file).parent / "reachability_map.pkl", [regions_file])
+            if self.pick_planner.reachability_map is None:
+                print("ReachabilityMap: run build_reachability_map.py to build it; pick pose candidates won't be filtered.")
 
         self.state = 1  # 1 for pre-picking, 2 for picking, 3 for post-picking, 0 for placing
         
@@ -98,6 +102,7 @@ class MotionPlanner(LeafSystem):
         self.q_pick = None
         self.q_pre_pick = None
         self.q_place = self.pick_planner.solve_q_place(self.source_regions)
+        self.ik_cache.maybe_save()
         self.target_regions = None
         self.target_box = None  # BodyIndex object; note that this value is only updated after the robot reaches the pre-pick position for this box
         self.box_weld_joint = None
@@ -248,7 +253,8 @@ class MotionPlanner(LeafSystem):
         # State machine for planning paths to each pick/pre-pick/post-pick/place position
         if self.state == 1:  # Pre-Pick
             if self.target_regions is None:  # If program has just initialized
-                self.target_regions = self.pick_planner.get_viable_pick_poses(box_poses, self.source_regions)  # List of Point objects in Configuration Space
+                self.target_regions = self.pick_planner.get_viable_pick_poses(box_poses, self.source_regions, q_current)  # List of Point objects in Configuration Space
+                self.ik_cache.maybe_save()
                 try:
                     # Plan trajectory to pre-pick pose
                     self.traj = self.perform_gcs_traj_opt(q_current, list(self.target_regions.keys()), self.source_regions.copy())
@@ -274,9 +280,10 @@ class MotionPlanner(LeafSystem):
                 eef_model_idx = self.original_plant.GetModelInstanceByName("kuka")  # ModelInstanceIndex
                 eef_body_idx = self.original_plant.GetBodyIndices(eef_model_idx)[-1]  # BodyIndex
                 self.original_plant.GetJointByName(f"{eef_body_idx}-{self.target_box}").Lock(self.original_plant_context)
+                self.pick_planner.mark_picked(self.target_box)  # Removed from the pile; exposes the boxes below it
 
                 # Compute post-pick pose, a few cm above the pick pose
-                self.q_post_pick, _ = ik(self.plant, self.plant_context, RigidTransform(self.X_pick.rotation(), self.X_pick.translation() + [0, 0, 0.075]), regions=self.source_regions_place, pose_as_constraint=False)
+                self.q_post_pick, _ = self.ik_cache.ik(self.plant, self.plant_context, RigidTransform(self.X_pick.rotation(), self.X_pick.translation() + [0, 0, 0.075]), regions=self.source_regions_place, pose_as_constraint=False, project_onto_regions=True)
 
                 # Update state to post-picking and compute post-picking trajectory
                 self.state = 3
@@ -301,7 +308,8 @@ class MotionPlanner(LeafSystem):
 
                 # Update state to pre-picking and compute trajectory to a viable pre-pick pose
                 self.state = 1
-                self.target_regions = self.pick_planner.get_viable_pick_poses(box_poses, self.source_regions)  # List of Point objects in Configuration Space
+                self.target_regions = self.pick_planner.get_viable_pick_poses(box_poses, self.source_regions, q_current)  # List of Point objects in Configuration Space
+                self.ik_cache.maybe_save()
                 self.traj = self.correct_traj_time(self.perform_gcs_traj_opt(q_current, list(self.target_regions.keys()), self.source_regions.copy()), context)
 
         state.get_mutable_abstract_state(int(self.traj_idx)).set_value(self.traj)
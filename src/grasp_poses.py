@@ -0,0 +1,65 @@
+"""
+Vectorized pre-pick and pick pose generation.
+
+A box is grasped by pushing the end effector into one of its 6 faces: the
+pre-pick pose is PREPICK_MARGIN out from the face's center, with the end
+effector z-axis pointing into the face, and the pick pose is the pre-pick pose
+moved PREPICK_MARGIN - GRIPPER_THICKNESS along that axis (so the suction
+gripper touches the face).
+
+Poses are generated for all boxes and faces at once as (..., 4, 4) np arrays
+of homogeneous transforms, which BatchIK, IKCache and ReachabilityMap accept
+directly (RigidTransforms only need to be built for the poses that are kept).
+"""
+from pydrake.all import RotationMatrix
+
+import numpy as np
+
+from scenario import BOX_DIM, PREPICK_MARGIN, GRIPPER_THICKNESS
+from box_overlap import BOX_CENTER_OFFSET
+
+# End effector orientations (in the box frame) for the 6 faces of a box: +x, -x, +y, -y, +z, -z
+FACE_ROTATIONS = np.array([
+    RotationMatrix.MakeYRotation(-np.pi/2).matrix(),
+    RotationMatrix.MakeYRotation(np.pi/2).matrix(),
+    RotationMatrix.MakeXRotation(np.pi/2).matrix(),
+    RotationMatrix.MakeXRotation(-np.pi/2).matrix(),
+    RotationMatrix.MakeXRotation(np.pi).matrix(),
+    np.identity(3),
+])
+APPROACH_DIRECTIONS = FACE_ROTATIONS[:, :, 2]  # End effector z-axis (pointing into the face) for each face
+
+
+def homogeneous(rotations, translations):
+    """
+    (..., 4, 4) np array of homogeneous transforms from (..., 3, 3) rotations
+    and (..., 3) translations.
+    """
+    X = np.zeros(np.shape(translations)[:-1] + (4, 4))
+    X[..., :3, :3] = rotations
+    X[..., :3, 3] = translations
+    X[..., 3, 3] = 1
+    return X
+
+
+def pre_pick_poses(rotations, translations):
+    """
+    Pre-pick poses for every face of boxes with body frames (at a corner of
+    the box) at the given (N, 3, 3) rotations and (N, 3) translations.
+
+    Returns an (N, 6, 4, 4) np array; face order is that of FACE_ROTATIONS.
+    """
+    centers = translations + rotations @ BOX_CENTER_OFFSET
+    R = np.einsum("nij,fjk->nfik", rotations, FACE_ROTATIONS)
+    p = centers[:, None, :] - (BOX_DIM/2 + PREPICK_MARGIN) * R[..., :, 2]  # Back out from the face along the approach direction
+    return homogeneous(R, p)
+
+
+def pick_poses(X_pre_pick):
+    """
+    Pick poses for (..., 4, 4) pre-pick poses: each is moved towards the box
+    along its own z-axis.
+    """
+    X = np.array(X_pre_pick, dtype=float)
+    X[..., :3, 3] += (PREPICK_MARGIN - GRIPPER_THICKNESS) * X[..., :3, 2]
+    return X
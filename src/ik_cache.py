@@ -0,0 +1,165 @@
+"""
+Cache of IK results, so fixed poses (i.e. the box deposit pose) and pick poses
+of boxes that haven't moved aren't re-solved on every startup/place cycle.
+
+Results are keyed by the quantized pose, the IK mode (utils.ik() keyword
+arguments, with defaults filled in), and a content hash of the region set. The
+cache can be backed by a pickle file, which is discarded whenever any of the
+region files it was built from (or the file format) changes. The file is
+written at most every save_period seconds, and on exit.
+"""
+from pathlib import Path
+import atexit
+import hashlib
+import inspect
+import numpy as np
+import os
+import pickle
+import time
+
+from utils import ik
+from collision_cache import obstacles_fingerprint
+
+
+# utils.ik() keyword arguments (other than regions) and their defaults, so equivalent calls share keys
+IK_DEFAULTS = {name: parameter.default for name, parameter in inspect.signature(ik).parameters.items()
+               if parameter.default is not inspect.Parameter.empty and name != "regions"}
+
+
+def files_fingerprint(files):
+    fingerprint = hashlib.sha1()
+    for file in files:
+        with open(file, "rb") as f:
+            fingerprint.update(f.read())
+    return fingerprint.hexdigest()
+
+
+class IKCache():
+    """
+    Maps (quantized pose, IK mode, region set hash) to (q, success).
+    """
+    FORMAT_VERSION = 2
+
+    def __init__(self, file=None, regions_files=(), position_resolution=1e-4, rotation_resolution=1e-4, save_period=60.0):
+        """
+        file is an optional pickle file to load from/save to.
+
+        regions_files is a list of the region YAML files the cached results
+        depend on; if their contents differ from when the file was saved, the
+        saved results are discarded.
+
+        position_resolution (in m) and rotation_resolution (on rotation matrix
+        entries) are the quantization steps used to build cache keys.
+
+        save_period (in s) is the minimum time between two writes of the file
+        by maybe_save(); the file is also written when the process exits.
+        """
+        self.file = Path(file) if file is not None else None
+        self.position_resolution = position_resolution
+        self.rotation_resolution = rotation_resolution
+        self.regions_files_fingerprint = files_fingerprint(regions_files)
+        self.save_period = save_period
+
+        self.results = {}
+        if self.file is not None and self.file.exists():
+            with open(self.file, "rb") as f:
+                saved = pickle.load(f)
+            if saved.get("version") != IKCache.FORMAT_VERSION:
+                print("IKCache: saved IK results are from an older version; discarding them.")
+            elif saved["regions_files_fingerprint"] == self.regions_files_fingerprint:
+                self.results = saved["results"]
+            else:
+                print("IKCache: region files changed; discarding saved IK results.")
+        self.last_save_time = time.time()
+        self.dirty = False  # Whether there are results that haven't been saved yet
+        if self.file is not None:
+            atexit.register(self.save)
+
+        self.regions_fingerprints = {}  # Maps id(regions) to (regions, fingerprint)
+        self.hits = 0
+        self.misses = 0
+
+
+    def _regions_fingerprint(self, regions):
+        if regions is None:
+            return None
+        cached = self.regions_fingerprints.get(id(regions))
+        if cached is None or cached[0] is not regions:
+            cached = (regions, obstacles_fingerprint(list(regions.values())))
+            self.regions_fingerprints[id(regions)] = cached  # Keeps regions alive, so ids aren't reused
+        return cached[1]
+
+
+    def key(self, pose, regions, ik_kwargs):
+        X = pose if isinstance(pose, np.ndarray) else pose.GetAsMatrix4()  # RigidTransform or 4x4 np array
+        p = np.round(X[:3, 3] / self.position_resolution).astype(np.int64)
+        R = np.round(X[:3, :3] / self.rotation_resolution).astype(np.int64)
+        return (p.tobytes(), R.tobytes(), tuple(sorted({**IK_DEFAULTS, **ik_kwargs}.items())), self._regions_fingerprint(regions))
+
+
+    def get(self, pose, regions=None, **ik_kwargs):
+        """
+        Returns the cached (q, success), or None.
+        """
+        result = self.results.get(self.key(pose, regions, ik_kwargs))
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+
+    def put(self, pose, q, success, regions=None, **ik_kwargs):
+        self.results[self.key(pose, regions, ik_kwargs)] = (np.array(q), bool(success))
+        self.dirty = True
+
+
+    def ik(self, plant, plant_context, pose, regions=None, **ik_kwargs):
+        """
+        Cached version of utils.ik() (with the same arguments).
+        """
+        result = self.get(pose, regions, **ik_kwargs)
+        if result is None:
+            result = ik(plant, plant_context, pose, regions=regions, **ik_kwargs)
+            self.put(pose, result[0], result[1], regions, **ik_kwargs)
+        return result
+
+
+    def batch_ik(self, batch_ik, poses, regions=None, **ik_kwargs):
+        """
+        Cached version of BatchIK.solve(); only the cache misses are solved.
+        """
+        results = [self.get(pose, regions, **ik_kwargs) for pose in poses]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            qs, successes = batch_ik.solve([poses[i] for i in misses], regions=regions, **ik_kwargs)
+            for i, q, success in zip(misses, qs, successes):
+                self.put(poses[i], q, success, regions, **ik_kwargs)
+                results[i] = (q, success)
+        print(f"IKCache: {len(poses) - len(misses)}/{len(poses)} IK results reused.")
+        return np.array([r[0] for r in results]).reshape(len(poses), -1), np.array([r[1] for r in results], dtype=bool)
+
+
+    def save(self):
+        if self.file is None or not self.dirty:
+            return
+        tmp_file = self.file.with_suffix(self.file.suffix + ".tmp")
+        with open(tmp_file, "wb") as f:
+            pickle.dump({"version": IKCache.FORMAT_VERSION, "regions_files_fingerprint": self.regions_files_fingerprint, "results": self.results}, f)
+        os.replace(tmp_file, self.file)  # Atomic so an interrupted run can't corrupt the cache
+        self.last_save_time = time.time()
+        self.dirty = False
+
+
+    def maybe_save(self):
+        """
+        Save if at least save_period seconds have passed since the last save.
+        """
+        if time.time() - self.last_save_time >= self.save_period:
+            self.save()
+
+
+    def print_stats(self):
+        num_queries = self.hits + self.misses
+        hit_rate = self.hits / num_queries if num_queries > 0 else 0.0
+        print(f"IKCache: {self.hits} hits, {self.misses} misses (hit rate {hit_rate:.2%}); {len(self.results)} cached results.")
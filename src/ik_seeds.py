@@ -0,0 +1,132 @@
+"""
+Task space to configuration lookup table for IK warm starts.
+
+Numeric IK used to always start from q_nominal, so poses far from nominal
+converged slowly or failed (and were then retried across regions).
+IKSeedTable samples configurations offline, computes the end effector pose of
+each, and stores a k-d tree over (position, scaled rotation matrix entries);
+at query time the configurations whose end effector poses are nearest the
+target are used as multi-start seeds.
+
+The table is built offline by build_ik_seed_table.py and only loaded at
+runtime (see get_ik_seed_table()); it must be rebuilt whenever the plant's
+kinematics change.
+"""
+from scipy.spatial import cKDTree
+
+import hashlib
+import numpy as np
+import os
+import pickle
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+SEED_TABLE_FILE = os.path.join(current_dir, '../data/ik_seed_table.pkl')
+
+
+def plant_kinematics_fingerprint(plant, eef_frame_name="arm_eef", num_probes=10):
+    """
+    Hash of the plant's joint limits and end effector poses at a few fixed
+    configurations; changes whenever the arm's kinematics do.
+    """
+    plant_context = plant.CreateDefaultContext()
+    eef_frame = plant.GetFrameByName(eef_frame_name)
+    lower, upper = plant.GetPositionLowerLimits(), plant.GetPositionUpperLimits()
+    fingerprint = hashlib.sha1()
+    fingerprint.update(np.round(np.concatenate((lower, upper)), 6).tobytes())
+    for q in np.random.default_rng(0).uniform(np.maximum(lower, -np.pi), np.minimum(upper, np.pi), (num_probes, plant.num_positions())):
+        plant.SetPositions(plant_context, q)
+        fingerprint.update(np.round(eef_frame.CalcPoseInWorld(plant_context).GetAsMatrix4(), 6).tobytes())
+    return fingerprint.hexdigest()
+
+
+class IKSeedTable():
+    """
+    k-d tree from end effector poses to the configurations that reach them.
+    """
+    def __init__(self, configurations, eef_poses, orientation_weight=0.5):
+        """
+        configurations is an N x num_positions np array; eef_poses is an
+        N x 4 x 4 np array of the corresponding end effector poses in world.
+
+        orientation_weight (in m) scales the rotation matrix entries relative
+        to the position, i.e. how many meters of position error a rotation
+        error is worth when looking up neighbors.
+        """
+        self.configurations = configurations
+        self.orientation_weight = orientation_weight
+        self.tree = cKDTree(self.features(eef_poses))
+
+
+    def features(self, eef_poses):
+        """
+        eef_poses is an N x 4 x 4 np array; returns an N x 12 np array.
+        """
+        eef_poses = np.asarray(eef_poses).reshape(-1, 4, 4)
+        return np.hstack((eef_poses[:, :3, 3], self.orientation_weight * eef_poses[:, :3, :3].reshape(-1, 9)))
+
+
+    @staticmethod
+    def build(plant, num_samples=20000, eef_frame_name="arm_eef", orientation_weight=0.5, seed=0):
+        """
+        Sample num_samples configurations uniformly within the plant's joint
+        limits and compute their end effector poses.
+        """
+        start = time.time()
+        plant_context = plant.CreateDefaultContext()
+        eef_frame = plant.GetFrameByName(eef_frame_name)
+        lower, upper = plant.GetPositionLowerLimits(), plant.GetPositionUpperLimits()
+        configurations = np.random.default_rng(seed).uniform(np.maximum(lower, -np.pi), np.minimum(upper, np.pi), (num_samples, plant.num_positions()))
+        eef_poses = np.zeros((num_samples, 4, 4))
+        for i, q in enumerate(configurations):
+            plant.SetPositions(plant_context, q)
+            eef_poses[i] = eef_frame.CalcPoseInWorld(plant_context).GetAsMatrix4()
+        print(f"IKSeedTable: built from {num_samples} samples in {time.time() - start:.2f}s.")
+        return IKSeedTable(configurations, eef_poses, orientation_weight)
+
+
+    def nearest(self, pose, k=3):
+        """
+        Returns a k x num_positions np array of the stored configurations whose
+        end effector poses are nearest pose (a RigidTransform), nearest first.
+        """
+        _, indices = self.tree.query(self.features(pose.GetAsMatrix4())[0], k=k)
+        return self.configurations[np.atleast_1d(indices)]
+
+
+def save_ik_seed_table(plant, table, file=SEED_TABLE_FILE):
+    """
+    Save table (built for plant) to file, along with the plant's kinematics
+    fingerprint.
+    """
+    tmp_file = file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump({"fingerprint": plant_kinematics_fingerprint(plant), "table": table}, f)
+    os.replace(tmp_file, file)  # Atomic so concurrent workers never read a partial file
+
+
+_seed_tables = {}  # Maps plant kinematics fingerprint to IKSeedTable (or None if there is none)
+
+
+def get_ik_seed_table(plant, file=SEED_TABLE_FILE):
+    """
+    IKSeedTable for a plant, loaded from file if it was built for the same
+    kinematics, otherwise None (run build_ik_seed_table.py to build it).
+    Shared by every IK service in the process.
+    """
+    fingerprint = plant_kinematics_fingerprint(plant)
+    if fingerprint in _seed_tables:
+        return _seed_tables[fingerprint]
+
+    table = None
+    if file is not None and os.path.exists(file):
+        with open(file, "rb") as f:
+            saved = pickle.load(f)
+        if saved["fingerprint"] == fingerprint:
+            table = saved["table"]
+        else:
+            print("IKSeedTable: saved table is for different kinematics; run build_ik_seed_table.py to rebuild it.")
+    else:
+        print("IKSeedTable: no saved table; run build_ik_seed_table.py to build it. IK will start from q_nominal.")
+    _seed_tables[fingerprint] = table
+    return table
@@ -0,0 +1,369 @@
+"""
+Reusable IK programs.
+
+utils.ik() used to build a new InverseKinematics program (and a symbolic
+logical_and of every halfspace of the region) for every region on every call.
+IKService instead builds one program per constraint structure (pose as
+constraint or as cost, with or without a region constraint) per plant context,
+and only swaps the target pose and region in between solves:
+ - the region constraint is a LinearConstraint whose A/b are updated in place,
+ - the position constraint's bounds are updated in place,
+ - the orientation constraint and the pose costs (whose targets can't be
+   changed in place) are removed and re-added, which is cheap.
+
+With regions, the IK is first solved once without any region constraint; if
+that solution already lies in a region it is returned directly, otherwise
+regions are ranked by their distance to it (see RegionRanker) and only the
+nearest few are tried, instead of every region in file order.
+
+If the pose is only a cost (pose_as_constraint=False), solve_and_project()
+skips region-constrained IK entirely: the IK is solved once, and if the
+solution isn't in any region it is projected onto the nearest regions with
+small QPs (see ProjectionProgram).
+
+Before any of this, the closed-form IK (see analytic_ik.py) is tried: its
+solution branches are filtered by region membership and the one nearest
+q_nominal is returned. The optimizer is only used as a fallback, i.e. for
+singular or unreachable poses, or if no branch lies in a region. Its
+unconstrained solves are warm-started from the nearest configurations in the
+IK seed table (see ik_seeds.py; if it has been built), then from q_nominal.
+"""
+from pydrake.all import (
+    InverseKinematics,
+    MathematicalProgram,
+    OrientationConstraint,
+    OrientationCost,
+    PositionConstraint,
+    PositionCost,
+    RotationMatrix,
+    Solve,
+)
+
+from collections import OrderedDict
+import hashlib
+import numpy as np
+
+from scenario import q_nominal
+from coverage import region_membership
+from analytic_ik import AnalyticIK
+from ik_seeds import get_ik_seed_table
+
+
+class IKProgram():
+    """
+    One persistent InverseKinematics program for a given constraint structure.
+    """
+    def __init__(self, plant, plant_context, pose_as_constraint, with_region):
+        self.plant = plant
+        self.plant_context = plant_context
+        self.pose_as_constraint = pose_as_constraint
+        self.eef_frame = plant.GetFrameByName("arm_eef")
+
+        self.ik = InverseKinematics(plant, plant_context)
+        self.q_variables = self.ik.q()  # Get variables for MathematicalProgram
+        self.prog = self.ik.get_mutable_prog()
+        num_q = len(self.q_variables)
+
+        # q_variables must be within half-plane for every half-plane in region; A/b are set before each solve
+        self.region_constraint = None
+        if with_region:
+            self.region_constraint = self.prog.AddLinearConstraint(np.zeros((1, num_q)), [-np.inf], [np.inf], self.q_variables)
+
+        self.position_constraint = None
+        self.pose_bindings = []  # Bindings of the pose-dependent constraints/costs that are swapped on every solve
+        if pose_as_constraint:
+            self.position_constraint = PositionConstraint(plant, plant.world_frame(), np.zeros(3), np.zeros(3),
+                                                          self.eef_frame, np.zeros(3), plant_context)
+            self.prog.AddConstraint(self.position_constraint, self.q_variables)
+            self.nominal_cost = self.prog.AddQuadraticErrorCost(np.identity(num_q), q_nominal, self.q_variables)
+
+
+    def set_nominal(self, q):
+        """
+        Change the configuration the pose-as-constraint program is drawn
+        towards (q_nominal by default), i.e. the previous solution when tracking.
+        """
+        self.nominal_cost.evaluator().UpdateCoefficients(2 * np.identity(len(q)), -2 * q, q @ q)  # |x - q|^2 = x'x - 2q'x + q'q
+
+
+    def set_region(self, region):
+        A = region.A()
+        self.region_constraint.evaluator().UpdateCoefficients(A, np.full(A.shape[0], -np.inf), region.b())
+
+
+    def set_pose(self, pose, translation_error, rotation_error):
+        for binding in self.pose_bindings:
+            if self.pose_as_constraint:
+                self.prog.RemoveConstraint(binding)
+            else:
+                self.prog.RemoveCost(binding)
+
+        if self.pose_as_constraint:
+            self.position_constraint.set_bounds(pose.translation() - translation_error, pose.translation() + translation_error)
+            orientation_constraint = OrientationConstraint(self.plant, self.plant.world_frame(), pose.rotation(),
+                                                           self.eef_frame, RotationMatrix(), rotation_error, self.plant_context)
+            self.pose_bindings = [self.prog.AddConstraint(orientation_constraint, self.q_variables)]
+        else:
+            # Add costs instead of constraints for pose
+            position_cost = PositionCost(self.plant, self.plant.world_frame(), pose.translation(),
+                                         self.eef_frame, np.zeros(3), np.identity(3), self.plant_context)
+            orientation_cost = OrientationCost(self.plant, self.plant.world_frame(), pose.rotation(),
+                                               self.eef_frame, RotationMatrix(), 1, self.plant_context)
+            self.pose_bindings = [self.prog.AddCost(position_cost, self.q_variables),
+                                  self.prog.AddCost(orientation_cost, self.q_variables)]
+
+
+    def solve(self, initial_guess=q_nominal):
+        self.prog.SetInitialGuess(self.q_variables, initial_guess)
+        result = Solve(self.prog)
+        return result.GetSolution(self.q_variables), result
+
+
+class ProjectionProgram():
+    """
+    Persistent QP for the Euclidean projection of a configuration onto an
+    HPolyhedron (min |q - q0|^2 s.t. A q <= b); q0 and A/b are updated in place.
+    """
+    def __init__(self, num_q):
+        self.prog = MathematicalProgram()
+        self.q_variables = self.prog.NewContinuousVariables(num_q, "q")
+        self.cost = self.prog.AddQuadraticErrorCost(np.identity(num_q), np.zeros(num_q), self.q_variables)
+        self.region_constraint = self.prog.AddLinearConstraint(np.zeros((1, num_q)), [-np.inf], [np.inf], self.q_variables)
+
+
+    def project(self, q, region):
+        """
+        Returns the projection of q onto region and whether the QP succeeded.
+        """
+        num_q = len(q)
+        self.cost.evaluator().UpdateCoefficients(2 * np.identity(num_q), -2 * q, q @ q)  # |x - q|^2 = x'x - 2q'x + q'q
+        A = region.A()
+        self.region_constraint.evaluator().UpdateCoefficients(A, np.full(A.shape[0], -np.inf), region.b())
+        result = Solve(self.prog)
+        return result.GetSolution(self.q_variables), result.is_success()
+
+
+class RegionRanker():
+    """
+    Ranks regions by their distance to a configuration. Per-region data
+    (row-normalized halfspaces and, if a tie-break ever needs it, the
+    Chebyshev center) is cached by region name and a hash of the region's A/b,
+    for the max_regions most recently used regions.
+    """
+    def __init__(self, max_regions=256):
+        self.max_regions = max_regions
+        self.cache = OrderedDict()  # Maps (name, A/b hash) to [normalized A, normalized b, Chebyshev center or None]
+
+
+    def _region_data(self, name, region):
+        A, b = region.A(), region.b()
+        key = (name, hashlib.sha1(A.tobytes() + b.tobytes()).hexdigest())
+        data = self.cache.get(key)
+        if data is None:
+            row_norms = np.linalg.norm(A, axis=1)
+            data = [A / row_norms[:, None], b / row_norms, None]
+            self.cache[key] = data
+            while len(self.cache) > self.max_regions:
+                self.cache.popitem(last=False)  # Evict least recently used
+        self.cache.move_to_end(key)
+        return data
+
+
+    def rank(self, q, regions):
+        """
+        regions is a dict mapping names to HPolyhedrons.
+
+        Returns the indices of regions (in dict order) sorted from nearest to
+        farthest from q, and the corresponding distances. The distance is the
+        largest normalized halfspace violation (0 if q is in the region;
+        otherwise a lower bound on the Euclidean distance to the region), with
+        ties (i.e. the regions containing q) broken by distance to the
+        Chebyshev center.
+        """
+        names, regions = list(regions.keys()), list(regions.values())
+        data = [self._region_data(name, region) for name, region in zip(names, regions)]
+        violations = np.array([max(np.max(A @ q - b), 0) for A, b, _ in data])
+        center_distances = np.zeros(len(data))
+        values, counts = np.unique(violations, return_counts=True)
+        for i in np.flatnonzero(np.isin(violations, values[counts > 1])):  # Only tied regions need their centers
+            if data[i][2] is None:
+                data[i][2] = regions[i].ChebyshevCenter()
+            center_distances[i] = np.linalg.norm(q - data[i][2])
+        order = np.lexsort((center_distances, violations))
+        return order, violations[order]
+
+
+class IKService():
+    """
+    Same interface as utils.ik(), but with persistent IK programs (see
+    IKProgram) for a single plant and plant context.
+    """
+    def __init__(self, plant, plant_context, num_seeds=3):
+        """
+        num_seeds is the number of seed table configurations to try as
+        initial guesses (0 to always start from q_nominal).
+        """
+        self.plant = plant
+        self.plant_context = plant_context
+        self.num_seeds = num_seeds
+        self.seed_table = None  # Loaded on first use; False if there is none
+        self.programs = {}  # Maps (pose_as_constraint, with_region) to IKProgram
+        self.region_ranker = RegionRanker()
+        self.projection_program = ProjectionProgram(plant.num_positions())
+        self._analytic_ik = None  # Built on first use; False if the plant isn't supported
+
+
+    def analytic_ik(self):
+        """
+        AnalyticIK for the plant, or None if its kinematics aren't supported.
+        """
+        if self._analytic_ik is None:
+            try:
+                self._analytic_ik = AnalyticIK(self.plant)
+            except ValueError as e:
+                print(f"IKService: closed-form IK unavailable ({e}); using numeric IK only.")
+                self._analytic_ik = False
+        return self._analytic_ik or None
+
+
+    def solve_seeded(self, program, pose):
+        """
+        Solve program (whose pose is already set) from each of the nearest
+        seed table configurations to pose, then q_nominal, stopping at the
+        first success. Returns the last (q, result).
+        """
+        initial_guesses = []
+        if self.num_seeds > 0:
+            if self.seed_table is None:
+                self.seed_table = get_ik_seed_table(self.plant) or False
+            if self.seed_table:
+                initial_guesses = list(self.seed_table.nearest(pose, self.num_seeds))
+        for initial_guess in initial_guesses + [q_nominal]:
+            q, ik_result = program.solve(initial_guess=initial_guess)
+            if ik_result.is_success():
+                break
+        return q, ik_result
+
+
+    def solve_analytic(self, pose, regions=None, tol=1e-6):
+        """
+        Returns the closed-form solution branch nearest q_nominal (only
+        considering branches in one of regions, a list of HPolyhedrons, if
+        given), or None if there is none. Branches are polished nearest-first,
+        so usually only one is.
+        """
+        analytic_ik = self.analytic_ik()
+        if analytic_ik is None:
+            return None
+        branches, valid = analytic_ik.solve_batch([pose])
+        branches = branches[0][valid[0]]
+        for q in branches[np.argsort(np.linalg.norm(branches - q_nominal, axis=1))]:
+            q, error = analytic_ik.polish(q, pose)
+            if error > tol or np.any(q < analytic_ik.plant.GetPositionLowerLimits()) or np.any(q > analytic_ik.plant.GetPositionUpperLimits()):
+                continue
+            if regions is None or np.any(region_membership(regions, q)):
+                return q
+        return None
+
+
+    def program(self, pose_as_constraint, with_region):
+        key = (pose_as_constraint, with_region)
+        if key not in self.programs:
+            self.programs[key] = IKProgram(self.plant, self.plant_context, pose_as_constraint, with_region)
+        return self.programs[key]
+
+
+    def solve(self, pose, translation_error=0, rotation_error=0.05, regions=None, pose_as_constraint=True, num_regions_to_try=5, project_onto_regions=False):
+        """
+        See utils.ik().
+        """
+        q = self.solve_analytic(pose, list(regions.values()) if regions is not None and len(regions) > 0 else None)
+        if q is not None:
+            print(f"IK solve succeeded (closed form). q: {q}")
+            return q, True
+
+        if project_onto_regions and regions is not None and not pose_as_constraint:
+            return self.solve_and_project(pose, regions, num_regions_to_try)
+
+        # Solve without any region constraint first
+        program = self.program(pose_as_constraint, False)
+        program.set_pose(pose, translation_error, rotation_error)
+        q, ik_result = self.solve_seeded(program, pose)
+        if regions is None or len(regions) == 0:
+            if ik_result.is_success():
+                print(f"IK solve succeeded. q: {q}")
+                return q, True
+            print(f"ERROR: IK fail: {ik_result.get_solver_id().name()}. Returning Best Guess.")
+            return q, False
+
+        order, distances = self.region_ranker.rank(q, regions)
+        regions = list(regions.values())
+        if ik_result.is_success() and distances[0] <= 1e-9:
+            print(f"IK solve succeeded. q: {q}")  # Unconstrained solution already lies in a region
+            return q, True
+
+        # Try the nearest regions, with the constraint that the IK result must be in that region
+        q_unconstrained = q
+        program = self.program(pose_as_constraint, True)
+        program.set_pose(pose, translation_error, rotation_error)
+        for i in order[:num_regions_to_try]:
+            program.set_region(regions[i])
+            q, ik_result = program.solve(initial_guess=q_unconstrained)
+            if ik_result.is_success():
+                print(f"IK solve succeeded. q: {q}")
+                return q, True
+
+        print(f"ERROR: IK fail: {ik_result.get_solver_id().name()}. Returning Best Guess.")
+        return q, False
+
+
+    def solve_and_project(self, pose, regions, num_regions_to_try=5):
+        """
+        Region-constrained IK with the pose as a cost, for the cost of one IK
+        solve plus a few QPs: solve the IK without a region constraint, and if
+        the solution isn't in any region, return its projection onto the
+        nearest region (of the num_regions_to_try nearest-ranked ones).
+
+        Returns the configuration and whether it lies in one of the regions.
+        """
+        program = self.program(False, False)
+        program.set_pose(pose, 0, 0)
+        q, ik_result = self.solve_seeded(program, pose)
+        if not ik_result.is_success():
+            print(f"ERROR: IK fail: {ik_result.get_solver_id().name()}. Returning Best Guess.")
+            return q, False
+
+        if np.any(region_membership(list(regions.values()), q)):
+            print(f"IK solve succeeded. q: {q}")
+            return q, True
+
+        # The ranking distances are lower bounds on the projection distances, so stop once no closer projection is possible
+        order, distances = self.region_ranker.rank(q, regions)
+        regions = list(regions.values())
+        q_best, best_distance = None, np.inf
+        for i, lower_bound in zip(order[:num_regions_to_try], distances[:num_regions_to_try]):
+            if lower_bound >= best_distance:
+                break
+            q_projected, success = self.projection_program.project(q, regions[i])
+            if success and np.linalg.norm(q_projected - q) < best_distance:
+                q_best, best_distance = q_projected, np.linalg.norm(q_projected - q)
+
+        if q_best is None:
+            print(f"ERROR: IK fail: could not project onto any region. Returning Best Guess.")
+            return q, False
+        print(f"IK solve succeeded (projected {best_distance:.3f} rad onto a region). q: {q_best}")
+        return q_best, True
+
+
+_ik_services = {}  # Maps id(plant_context) to IKService (which keeps plant_context alive, so ids aren't reused)
+
+
+def get_ik_service(plant, plant_context):
+    """
+    IKService for a plant context, created on first use.
+    """
+    service = _ik_services.get(id(plant_context))
+    if service is None or service.plant is not plant:
+        service = IKService(plant, plant_context)
+        _ik_services[id(plant_context)] = service
+    return service
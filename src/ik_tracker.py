@@ -0,0 +1,129 @@
+"""
+Warm-started incremental IK for teleoperation and tracking.
+
+teleop.py used to build a new InverseKinematics program on every output
+evaluation and solve it from q_nominal. IKTracker instead keeps one persistent
+IKProgram (see ik_service.py) and warm-starts every solve from (and draws it
+towards) the previous solution, so consecutive targets give consecutive
+configurations. Repeated targets are not re-solved at all, and small target
+changes can be tracked with a few damped least-squares (differential IK)
+steps instead of a full solve.
+"""
+from pydrake.all import (
+    JacobianWrtVariable,
+    RigidTransform,
+)
+
+import numpy as np
+
+from scenario import q_nominal
+from ik_service import IKProgram
+
+
+def pose_error(pose, X_WE):
+    """
+    6D (rotation, translation) error of X_WE with respect to pose, in world.
+    """
+    angle_axis = (pose.rotation() @ X_WE.rotation().inverse()).ToAngleAxis()
+    return np.concatenate((angle_axis.angle() * angle_axis.axis(), pose.translation() - X_WE.translation()))
+
+
+class IKTracker():
+    """
+    Stateful IK for a stream of end effector target poses.
+    """
+    def __init__(self, plant, plant_context=None, mode="auto", q_initial=q_nominal, eef_frame_name="arm_eef",
+                 differential_threshold=0.05, differential_iterations=3, damping=1e-3, tol=1e-6):
+        """
+        mode is "full" (always solve the IK program), "differential" (always
+        take damped least-squares steps, falling back to a full solve if they
+        don't converge), or "auto" (differential steps if the target moved by
+        less than differential_threshold, a full solve otherwise).
+
+        differential_threshold is on the norm of the 6D (rotation in rad,
+        translation in m) change of the target pose.
+        """
+        if mode not in ("full", "differential", "auto"):
+            raise ValueError(f"Unknown IKTracker mode {mode}.")
+        self.plant = plant
+        self.plant_context = plant_context if plant_context is not None else plant.CreateDefaultContext()
+        self.mode = mode
+        self.eef_frame = plant.GetFrameByName(eef_frame_name)
+        self.differential_threshold = differential_threshold
+        self.differential_iterations = differential_iterations
+        self.damping = damping
+        self.tol = tol
+        self.lower_limits = plant.GetPositionLowerLimits()
+        self.upper_limits = plant.GetPositionUpperLimits()
+
+        self.program = IKProgram(plant, self.plant_context, pose_as_constraint=True, with_region=False)
+        self.q = np.array(q_initial, dtype=float)
+        self.success = False
+        self.target = None  # 4x4 np array of the last target pose
+
+        self.num_skipped = 0
+        self.num_differential = 0
+        self.num_full = 0
+
+
+    def reset(self, q=q_nominal):
+        self.q = np.array(q, dtype=float)
+        self.success = False
+        self.target = None
+
+
+    def eef_pose(self, q):
+        self.plant.SetPositions(self.plant_context, q)
+        return self.eef_frame.CalcPoseInWorld(self.plant_context)
+
+
+    def differential_step(self, pose):
+        """
+        Damped least-squares steps from the previous solution towards pose.
+        Returns the resulting q and whether it reaches pose within tol.
+        """
+        q = self.q
+        for _ in range(self.differential_iterations):
+            error = pose_error(pose, self.eef_pose(q))
+            if np.linalg.norm(error) < self.tol:
+                break
+            J = self.plant.CalcJacobianSpatialVelocity(self.plant_context, JacobianWrtVariable.kQDot, self.eef_frame,
+                                                       np.zeros(3), self.plant.world_frame(), self.plant.world_frame())
+            q = np.clip(q + J.T @ np.linalg.solve(J @ J.T + self.damping**2 * np.identity(6), error), self.lower_limits, self.upper_limits)
+        return q, np.linalg.norm(pose_error(pose, self.eef_pose(q))) < self.tol
+
+
+    def full_solve(self, pose, rotation_error):
+        self.program.set_pose(pose, 0, rotation_error)
+        self.program.set_nominal(self.q)
+        q, result = self.program.solve(initial_guess=self.q)
+        return q, result.is_success()
+
+
+    def update(self, pose, rotation_error=0.0):
+        """
+        Track a new target pose (RigidTransform of the end effector in world).
+
+        Returns the configuration and whether it reaches the pose. On failure,
+        the previous configuration is kept (and returned).
+        """
+        X = pose.GetAsMatrix4()
+        if self.target is not None and np.array_equal(X, self.target):
+            self.num_skipped += 1
+            return self.q, self.success
+
+        use_differential = self.success and (self.mode == "differential" or (self.mode == "auto" and
+                           np.linalg.norm(pose_error(pose, RigidTransform(self.target))) < self.differential_threshold))
+        success = False
+        if use_differential:
+            q, success = self.differential_step(pose)
+            self.num_differential += 1
+        if not success:
+            q, success = self.full_solve(pose, rotation_error)
+            self.num_full += 1
+
+        self.target = X
+        self.success = success
+        if success:
+            self.q = q
+        return self.q, self.success
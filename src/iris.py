@@ -31,11 +31,30 @@ import pyvista as pv
 import time
 matplotlib.use("tkagg")
 
+from region_pruning import prune_regions
+from region_postprocessing import batch_reduce_inequalities, batch_simplify_by_incremental_face_translation
+from clique_cover import regions_from_points
+from task_space_seeding import TaskSpaceSeeder
+from collision_cache import CachedCollisionChecker
+from edge_cache import scene_fingerprint
+from parallelism import get_parallelism
+
 
 class IrisRegionGenerator():
-    def __init__(self, meshcat, collision_checker, regions_file, DEBUG=False):
+    def __init__(self, meshcat, collision_checker, regions_file, DEBUG=False, edge_store=None, scene_description="", task_space_num_workers=1):
+        """
+        edge_store is an optional EdgeResultStore used when building visibility
+        graphs for the directed seeding modes; scene_description (i.e. the
+        scenario YAML string of the collision checker's diagram) identifies the
+        scene in that store, and is required with it.
+
+        task_space_num_workers is passed to the TaskSpaceSeeder (IK is solved
+        in-process by default); call close() (or use the generator as a
+        context manager) to shut down its worker pool.
+        """
         self.meshcat = meshcat
         self.collision_checker = collision_checker  # ConfigurationObstacleCollisionChecker
+        self.cached_collision_checker = CachedCollisionChecker(collision_checker)  # For repeated Python-side queries (i.e. fixed-seed coverage estimates)
         self.plant = collision_checker.plant()
         self.plant_context = collision_checker.plant_context()
 
@@ -43,6 +62,28 @@ class IrisRegionGenerator():
 
         self.DEBUG = DEBUG
 
+        self.task_space_seeder = None  # Created on first use of seeding_mode "task_space"
+        self.task_space_num_workers = task_space_num_workers
+
+        if edge_store is not None and not scene_description:
+            raise ValueError("IrisRegionGenerator needs a scene_description to use an edge_store.")
+        self.edge_store = edge_store
+        self.scene_description = scene_description
+
+
+    def close(self):
+        if self.task_space_seeder is not None:
+            self.task_space_seeder.close()
+            self.task_space_seeder = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
 
     @staticmethod
     def visualize_connectivity(iris_regions, coverage, output_file='../iris_connectivity.svg', skip_svg=False):
@@ -89,7 +130,7 @@ class IrisRegionGenerator():
         sampling_domain = HPolyhedron.MakeBox(self.plant.GetPositionLowerLimits(), self.plant.GetPositionUpperLimits())
         last_sample = sampling_domain.UniformSample(rng)
 
-        self.collision_checker.SetConfigurationSpaceObstacles([])  # We don't want to account for any c-space obstacles during the coverge estimate
+        self.cached_collision_checker.SetConfigurationSpaceObstacles([])  # We don't want to account for any c-space obstacles during the coverge estimate
 
         num_samples_in_regions = 0
         num_samples_collision_free = 0
@@ -97,7 +138,7 @@ class IrisRegionGenerator():
             last_sample = sampling_domain.UniformSample(rng, last_sample)
 
             # Check if sample is in collision
-            if self.collision_checker.CheckConfigCollisionFree(last_sample):
+            if self.cached_collision_checker.CheckConfigCollisionFree(last_sample):
                 num_samples_collision_free += 1
 
                 # If sample is collsion-free, check if sample falls in regions
@@ -115,14 +156,14 @@ class IrisRegionGenerator():
         sampling_domain = HPolyhedron.MakeBox(self.plant.GetPositionLowerLimits(), self.plant.GetPositionUpperLimits())
         last_sample = sampling_domain.UniformSample(rng)
 
-        self.collision_checker.SetConfigurationSpaceObstacles([])  # We don't want to account for any c-space obstacles during this visualization
+        self.cached_collision_checker.SetConfigurationSpaceObstacles([])  # We don't want to account for any c-space obstacles during this visualization
 
         collision_free_samples = None  # N x cspace_dim array
         for _ in range(num_samples):
             last_sample = sampling_domain.UniformSample(rng, last_sample)
 
             # Check if the sample is in collision
-            if self.collision_checker.CheckConfigCollisionFree(last_sample):
+            if self.cached_collision_checker.CheckConfigCollisionFree(last_sample):
                 if collision_free_samples is None:
                     collision_free_samples = last_sample[np.newaxis, :]
                 else:
@@ -343,7 +384,11 @@ class IrisRegionGenerator():
                                      num_points_per_visibility_round=500, 
                                      clique_covers_seed=0, 
                                      use_previous_saved_regions=True, 
-                                     coverage_check_only=False):
+                                     coverage_check_only=False,
+                                     visualize=True,
+                                     num_workers=None,
+                                     seeding_mode="uniform",
+                                     sample_bank=None):
         """
         Source IRIS regions are defined as the regions considering only self-
         collision with the robot, and collision with the walls of the empty truck
@@ -351,6 +396,27 @@ class IrisRegionGenerator():
 
         This function automatically searches the regions_file for existing
         regions, and begins with those.
+
+        visualize can be set to False to skip the (slow) coverage estimate and
+        connectivity check after the regions are generated, i.e. when the
+        caller measures coverage itself.
+
+        num_workers is the number of workers used to post-process the new
+        regions (defaults to the shared parallelism setting).
+
+        seeding_mode selects where the visibility graph points come from:
+         - "uniform": Drake's IrisInConfigurationSpaceFromCliqueCover(), which
+           samples uniformly over the whole domain.
+         - "uncovered": points are drawn only from the collision-free samples
+           in sample_bank (a SampleBank) that are not yet in any region, so
+           each round's visibility checks are spent where coverage is missing.
+         - "task_space": points are IK solutions for end-effector poses sampled
+           in the truck trailer workspace (see TaskSpaceSeeder), so regions are
+           built where the robot actually needs to go.
+        For the directed seeding modes, coverage_threshold is not used;
+        termination is left to the caller (i.e. VisibilityRoundScheduler).
+
+        Returns the full list of regions (previous and new).
         """
         options = IrisFromCliqueCoverOptions()
         options.num_points_per_coverage_check = 1000
@@ -364,12 +430,14 @@ class IrisRegionGenerator():
         options.fast_iris_options.random_seed = 0
         options.fast_iris_options.verbose = True
         options.use_fast_iris = True
+        get_parallelism().apply_to_clique_cover_options(options)  # Visibility graph and collision checks
 
         if coverage_check_only:
             options.iteration_limit = 0
             regions = LoadIrisRegionsYamlFile(self.regions_file)
             regions = [hpolyhedron for hpolyhedron in regions.values()]
-            self.collision_checker.SetConfigurationSpaceObstacles([])  # We don't want to account for any c-space obstacles during the coverge estimate
+            self.cached_collision_checker.SetConfigurationSpaceObstacles([])  # We don't want to account for any c-space obstacles during the coverge estimate
+            region_obstacles = []
         elif use_previous_saved_regions:
             regions = LoadIrisRegionsYamlFile(self.regions_file)
             regions = [hpolyhedron for hpolyhedron in regions.values()]
@@ -381,26 +449,88 @@ class IrisRegionGenerator():
 
             # Set previous regions as obstacles to encourage exploration
             # options.iris_options.configuration_obstacles = region_obstacles  # No longer needed bc of the line below
-            self.collision_checker.SetConfigurationSpaceObstacles(region_obstacles)  # Set config. space obstacles in collision checker so FastIRIS will also respect them
+            self.cached_collision_checker.SetConfigurationSpaceObstacles(region_obstacles)  # Set config. space obstacles in collision checker so FastIRIS will also respect them
         else:
             regions = []
+            region_obstacles = []
 
-        regions = IrisInConfigurationSpaceFromCliqueCover(
-            checker=self.collision_checker, options=options, generator=RandomGenerator(clique_covers_seed), sets=regions
-        )  # List of HPolyhedrons
-
-        # Remove redundant hyperplanes
-        regions = [r.ReduceInequalities() for r in regions]
+        num_previous_regions = len(regions)
+        if seeding_mode == "uniform" or coverage_check_only:
+            regions = IrisInConfigurationSpaceFromCliqueCover(
+                checker=self.collision_checker, options=options, generator=RandomGenerator(clique_covers_seed), sets=regions
+            )  # List of HPolyhedrons (previous regions first, then new regions)
+        else:
+            points = self.sample_seed_points(seeding_mode, num_points_per_visibility_round, regions, seed=clique_covers_seed, sample_bank=sample_bank)
+            if points.shape[1] >= minimum_clique_size:
+                fingerprint = scene_fingerprint(self.collision_checker, self.scene_description, region_obstacles)
+                regions = regions + regions_from_points(self.collision_checker, points, options, edge_store=self.edge_store, scene_fingerprint=fingerprint)
+            else:
+                print(f"IrisRegionGenerator: only {points.shape[1]} seed points available; skipping clique covers round.")
+
+        # Remove redundant hyperplanes (previous regions were already reduced before being saved)
+        new_regions, _ = batch_reduce_inequalities(regions[num_previous_regions:],
+                                                   names=[f"set{i}" for i in range(num_previous_regions, len(regions))],
+                                                   num_workers=num_workers)
+        regions = regions[:num_previous_regions] + new_regions
 
         if not coverage_check_only:
             regions_dict = {f"set{i}" : regions[i] for i in range(len(regions))}
             SaveIrisRegionsYamlFile(self.regions_file, regions_dict)
 
-            self.test_iris_region(self.plant, self.plant_context, self.meshcat, regions, coverage=True, histogram=False, connectivity=True, svg=False, task_space_render=False)
+            if visualize:
+                self.test_iris_region(self.plant, self.plant_context, self.meshcat, regions, coverage=True, histogram=False, connectivity=True, svg=False, task_space_render=False)
+
+        return regions
         
     
+    def prune_saved_regions(self, sample_bank, output_file=None, max_coverage_loss=0.01, containment_threshold=0.98):
+        """
+        Load the regions in regions_file, remove regions that are (almost)
+        fully contained in other regions while keeping the region graph
+        connected (see region_pruning.prune_regions()), and save the smaller
+        region set.
+
+        output_file defaults to regions_file with a "_pruned" suffix so the
+        original regions are kept.
+        """
+        if output_file is None:
+            output_file = self.regions_file.with_name(f"{self.regions_file.stem}_pruned{self.regions_file.suffix}")
+
+        regions_dict = LoadIrisRegionsYamlFile(self.regions_file)
+        pruned_regions_dict = prune_regions(regions_dict, sample_bank, max_coverage_loss=max_coverage_loss, containment_threshold=containment_threshold)
+        SaveIrisRegionsYamlFile(output_file, pruned_regions_dict)
+        print(f"Pruned regions saved to {output_file}.")
+
+        return pruned_regions_dict
+
+
+    def sample_seed_points(self, seeding_mode, num_points, regions, seed=0, sample_bank=None):
+        """
+        Draw visibility graph points for the directed seeding modes of
+        generate_source_iris_regions().
+
+        Returns a cspace_dim x N np array of collision-free configurations
+        (N <= num_points).
+        """
+        if seeding_mode == "uncovered":
+            if sample_bank is None:
+                raise ValueError("seeding_mode 'uncovered' requires a sample_bank.")
+            uncovered_samples = sample_bank.free_samples[~sample_bank.covered_mask(regions)]
+            print(f"IrisRegionGenerator: {len(uncovered_samples)}/{len(sample_bank.free_samples)} collision-free samples are uncovered.")
+            rng = np.random.default_rng(seed)
+            idxs = rng.choice(len(uncovered_samples), size=min(num_points, len(uncovered_samples)), replace=False)
+            return uncovered_samples[idxs].T
+
+        if seeding_mode == "task_space":
+            if self.task_space_seeder is None:
+                self.task_space_seeder = TaskSpaceSeeder(self.collision_checker, num_workers=self.task_space_num_workers)
+            return self.task_space_seeder.sample(num_points, seed=seed)
+
+        raise ValueError(f"Unknown seeding_mode '{seeding_mode}'.")
+
+
     @staticmethod
-    def post_process_iris_regions(regions_dict, edge_count_threshold=0.75):
+    def post_process_iris_regions(regions_dict, edge_count_threshold=0.75, num_workers=None):
         """
         Simplify IRIS regions using SimplifyByIncrementalFaceTranslation()
         procedure. This reduces the number of faces on the HPolyhedron which
@@ -415,6 +545,9 @@ class IrisRegionGenerator():
         edge_count_threshold is a tunable value that controls what fraction of
         edges relative to the average warrants allowing that vertex's edges
         to be removed. Lower --> more edges are removed.
+
+        num_workers is the number of workers the simplifications are spread
+        across (defaults to the shared parallelism setting).
         """
         # First find number of edges on each region
         edge_counts = {}
@@ -434,21 +567,23 @@ class IrisRegionGenerator():
         avg_edge_count = sum(ct for ct in edge_counts.values()) / len(edge_counts)
         print(f"IRIS region avg_edge_count: {avg_edge_count}")
                     
-        # Then perform simplifications on each HPolyhedron
-        output_regions = {}
+        # Then perform simplifications on each HPolyhedron (in parallel)
+        all_intersecting_polytopes = []
         for s, r in regions_dict.items():
             intersecting_polytopes = []
             for s_, r_ in regions_dict.items():
                 if r.IntersectsWith(r_) and edge_counts[s_] < avg_edge_count * edge_count_threshold:
                     intersecting_polytopes.append(r_)
-
-            r_simplified = r.SimplifyByIncrementalFaceTranslation(min_volume_ratio=0.1,
-                                                                  max_iterations=1,
-                                                                  intersecting_polytopes=intersecting_polytopes,
-                                                                  random_seed=42)
-            print("finished call to SimplifyByIncrementalFaceTranslation.")
-            
-            output_regions[s] = r_simplified
+            all_intersecting_polytopes.append(intersecting_polytopes)
+
+        simplified_regions, _ = batch_simplify_by_incremental_face_translation(list(regions_dict.values()),
+                                                                               all_intersecting_polytopes,
+                                                                               names=list(regions_dict.keys()),
+                                                                               min_volume_ratio=0.1,
+                                                                               max_iterations=1,
+                                                                               random_seed=42,
+                                                                               num_workers=num_workers)
+        output_regions = dict(zip(regions_dict.keys(), simplified_regions))
         
         # FOR TESTING ONLY
         SaveIrisRegionsYamlFile("../data/TEMPORARY.yaml", output_regions)
@@ -456,3 +591,156 @@ class IrisRegionGenerator():
 
         return output_regions
 
+
+
+class VisibilityRoundScheduler():
+    """
+    Adaptive scheduler for repeated rounds of
+    IrisRegionGenerator.generate_source_iris_regions().
+
+    Instead of hardcoding the number of visibility graph points per round, this
+    measures the marginal coverage gained per wall-clock second in each round
+    (using a fixed SampleBank so rounds are directly comparable), and adjusts
+    the number of points and the minimum clique size for the next round.
+    Rounds stop once the marginal gain rate falls below min_gain_rate.
+
+    Wall-clock time is used rather than CPU time since the process CPU time
+    doesn't include worker processes (e.g. in batch_reduce_inequalities()).
+    """
+    def __init__(self,
+                 region_generator,
+                 sample_bank,
+                 min_gain_rate=1e-4,
+                 coverage_target=None,
+                 initial_num_points=50,
+                 max_num_points=5000,
+                 growth_factor=1.5,
+                 initial_minimum_clique_size=10,
+                 min_minimum_clique_size=7,
+                 patience=2,
+                 max_rounds=100,
+                 seeding_mode="uniform"):
+        """
+        region_generator is an IrisRegionGenerator.
+
+        sample_bank is a SampleBank built from the same collision checker.
+
+        min_gain_rate is the marginal coverage fraction gained per wall-clock
+        second below which a round counts as unproductive; after `patience`
+        consecutive unproductive rounds, scheduling stops.
+
+        coverage_target optionally stops scheduling once the sample bank
+        coverage reaches this fraction.
+
+        min_minimum_clique_size should not be less than cspace_dim + 1 = 7, the
+        minimum number of points needed to create a shape with volume in 6D.
+
+        seeding_mode is passed through to generate_source_iris_regions() (the
+        sample bank is also used to direct seeding in "uncovered" mode).
+        """
+        self.region_generator = region_generator
+        self.sample_bank = sample_bank
+        self.min_gain_rate = min_gain_rate
+        self.coverage_target = coverage_target
+        self.max_num_points = max_num_points
+        self.growth_factor = growth_factor
+        self.min_minimum_clique_size = min_minimum_clique_size
+        self.patience = patience
+        self.max_rounds = max_rounds
+        self.seeding_mode = seeding_mode
+
+        self.num_points = initial_num_points
+        self.minimum_clique_size = initial_minimum_clique_size
+
+        self.history = []  # List of dicts, one per round
+
+
+    def _adjust(self, gain_rate, prev_gain_rate, num_new_regions):
+        """
+        Update the number of points and minimum clique size for the next round.
+
+        If a round found no new regions, the visibility graph was too sparse to
+        contain cliques of the minimum size, so both knobs are loosened. If the
+        gain rate is improving, more points are paying off, so keep growing the
+        visibility graph. If the gain rate is falling, the remaining uncovered
+        pockets are likely too small for large cliques, so accept smaller ones.
+        """
+        if num_new_regions == 0:
+            self.num_points = int(self.num_points * self.growth_factor)
+            self.minimum_clique_size -= 1
+        elif prev_gain_rate is None or gain_rate >= prev_gain_rate:
+            self.num_points = int(self.num_points * self.growth_factor)
+        else:
+            self.minimum_clique_size -= 1
+
+        self.num_points = min(self.num_points, self.max_num_points)
+        self.minimum_clique_size = max(self.minimum_clique_size, self.min_minimum_clique_size)
+
+
+    def run(self, coverage_threshold=0.1, clique_covers_seed=0, use_previous_saved_regions=True):
+        """
+        Run rounds of region generation until the marginal coverage gain rate
+        drops below min_gain_rate (or one of the other stopping conditions is
+        met).
+
+        Returns the final list of regions.
+        """
+        if use_previous_saved_regions:
+            regions = [hpolyhedron for hpolyhedron in LoadIrisRegionsYamlFile(self.region_generator.regions_file).values()]
+        else:
+            regions = []
+        coverage = self.sample_bank.coverage(regions)
+        print(f"VisibilityRoundScheduler: starting coverage: {coverage}")
+
+        prev_gain_rate = None
+        num_unproductive_rounds = 0
+        for i in range(self.max_rounds):
+            print(f"Beginning Clique Covers Iteration {i} (num_points_per_visibility_round={self.num_points}, minimum_clique_size={self.minimum_clique_size}).")
+            num_regions_before = len(regions)
+
+            wall_start = time.perf_counter()
+            regions = self.region_generator.generate_source_iris_regions(minimum_clique_size=self.minimum_clique_size,
+                                                                         coverage_threshold=coverage_threshold,
+                                                                         num_points_per_visibility_round=self.num_points,
+                                                                         clique_covers_seed=clique_covers_seed + i,
+                                                                         use_previous_saved_regions=(use_previous_saved_regions or i > 0),
+                                                                         visualize=False,
+                                                                         seeding_mode=self.seeding_mode,
+                                                                         sample_bank=self.sample_bank)
+            wall_time = time.perf_counter() - wall_start
+
+            new_coverage = self.sample_bank.coverage(regions)
+            gain = new_coverage - coverage
+            gain_rate = gain / max(wall_time, 1e-9)  # Per wall-clock second
+            num_new_regions = len(regions) - num_regions_before
+
+            self.history.append({
+                "round": i,
+                "num_points_per_visibility_round": self.num_points,
+                "minimum_clique_size": self.minimum_clique_size,
+                "num_new_regions": num_new_regions,
+                "coverage": new_coverage,
+                "gain": gain,
+                "wall_time": wall_time,
+                "gain_rate": gain_rate,
+            })
+            print(f"VisibilityRoundScheduler: round {i}: {num_new_regions} new regions, coverage {coverage:.4f} -> {new_coverage:.4f}, "
+                  f"{wall_time:.1f} wall-s, gain rate {gain_rate:.2e}/wall-s.")
+            coverage = new_coverage
+
+            if self.coverage_target is not None and coverage >= self.coverage_target:
+                print(f"VisibilityRoundScheduler: reached coverage target {self.coverage_target}.")
+                break
+
+            if gain_rate < self.min_gain_rate:
+                num_unproductive_rounds += 1
+                if num_unproductive_rounds >= self.patience:
+                    print(f"VisibilityRoundScheduler: gain rate below {self.min_gain_rate}/wall-s for {self.patience} rounds; stopping.")
+                    break
+            else:
+                num_unproductive_rounds = 0
+
+            self._adjust(gain_rate, prev_gain_rate, num_new_regions)
+            prev_gain_rate = gain_rate
+
+        return regions
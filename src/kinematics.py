@@ -0,0 +1,23 @@
+"""
+Kinematic structure helpers (i.e. for AnalyticIK).
+"""
+
+
+def arm_chain(plant, model_instance_name="kuka", eef_frame_name="arm_eef"):
+    """
+    Returns the arm's actuated joints (in kinematic order) and its end
+    effector frame.
+    """
+    model_instance = plant.GetModelInstanceByName(model_instance_name)
+    eef_frame = plant.GetFrameByName(eef_frame_name, model_instance)
+
+    # Walk from the end effector back to the base (joint indices aren't necessarily in kinematic order)
+    joint_by_child = {plant.get_joint(j).child_body().index(): plant.get_joint(j) for j in plant.GetJointIndices(model_instance)}
+    joints = []
+    body_idx = eef_frame.body().index()
+    while body_idx in joint_by_child:
+        joint = joint_by_child[body_idx]
+        if joint.num_positions() > 0:
+            joints.append(joint)
+        body_idx = joint.parent_body().index()
+    return joints[::-1], eef_frame
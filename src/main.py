@@ -35,8 +35,11 @@ import logging
 import datetime
 
 from utils import diagram_visualize_connections
+from scene_factory import get_scene_factory
+from parallelism import ParallelismConfig, set_parallelism
 from scenario import NUM_BOXES, BOX_DIM, q_nominal, q_place_nominal, scenario_yaml, robot_yaml, scenario_yaml_for_iris, robot_pose, set_hydroelastic, set_up_scene, get_W_X_eef
-from iris import IrisRegionGenerator
+from iris import IrisRegionGenerator, VisibilityRoundScheduler
+from coverage import SampleBank
 from gcs import MotionPlanner
 from debug import Debugger
 
@@ -50,11 +53,15 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--fast', default='T', help="T/F; whether or not to use a pre-saved box configuration or randomize box positions from scratch.")
 parser.add_argument('--randomization', default=0, help="integer randomization seed.")
 parser.add_argument('--enable_hydroelastic', default='F', help="T/F; whether or not to enable hydroelastic contact in the SDF file.")
+parser.add_argument('--num_workers', default=None, help="integer number of threads/processes for collision checking, clique covers, and batch IK (defaults to the number of CPUs).")
+parser.add_argument('--parallelism_backend', default='processes', help="processes/threads; worker pool type for batch IK and region post-processing.")
 args = parser.parse_args()
 
 seed = int(args.randomization)
 randomize_boxes = (args.fast == 'F')
 set_hydroelastic(args.enable_hydroelastic == 'T')
+set_parallelism(ParallelismConfig(num_workers=int(args.num_workers) if args.num_workers is not None else None,
+                                  backend=args.parallelism_backend))  # Before any collision checkers are built
 
     
 #####################
@@ -84,22 +91,10 @@ meshcat.AddButton("Close")
 ### Diagram Setup ###
 #####################
 builder = DiagramBuilder()
-scenario = load_scenario(data=scenario_yaml)
+scene_factory = get_scene_factory()  # Parses model directives once and caches every plant variant built below
 
-### Add Boxes
-box_directives = f"""
-directives:
-"""
-for i in range(NUM_BOXES):
-    relative_path_to_box = '../data/Box_0_5_0_5_0_5.sdf'
-    absolute_path_to_box = os.path.abspath(relative_path_to_box)
-
-    box_directives += f"""
-- add_model: 
-    name: Boxes/Box_{i}
-    file: file://{absolute_path_to_box}
-"""
-scenario = add_directives(scenario, data=box_directives)
+### Scenario with boxes
+scenario = scene_factory.station_scenario(NUM_BOXES)
 
 
 def add_suction_joints(parser):
@@ -128,7 +123,7 @@ station = builder.AddSystem(MakeHardwareStation(
 
     # This is to be able to load our own models from a local path
     # we can refer to this using the "package://" URI directive
-    parser_preload_callback=lambda parser: parser.package_map().Add(this_drake_module_name, os.getcwd()),
+    parser_preload_callback=scene_factory.add_package_paths,
     parser_prefinalize_callback=add_suction_joints,
 ))
 scene_graph = station.GetSubsystemByName("scene_graph")
@@ -138,14 +133,12 @@ plant = station.GetSubsystemByName("plant")
 AddMultibodyTriad(plant.GetFrameByName("arm_eef"), scene_graph)
 
 ### GCS Motion Planer
-motion_planner = builder.AddSystem(MotionPlanner(plant, meshcat, robot_pose, box_randomization_runtime if randomize_boxes else 0, "../data/iris_source_regions.yaml", "../data/iris_source_regions_place.yaml"))
+motion_planner = builder.AddSystem(MotionPlanner(plant, meshcat, robot_pose, box_randomization_runtime if randomize_boxes else 0, "../data/iris_source_regions.yaml", "../data/iris_source_regions_place.yaml", scene_factory=scene_factory))
 builder.Connect(station.GetOutputPort("body_poses"), motion_planner.GetInputPort("body_poses"))
 builder.Connect(station.GetOutputPort("kuka_state"), motion_planner.GetInputPort("kuka_state"))
 
 ### Controller
-controller_plant = MultibodyPlant(time_step=0.001)
-Parser(controller_plant).AddModelsFromString(robot_yaml, ".dmd.yaml")[0]  # ModelInstance object
-controller_plant.Finalize()
+controller_plant = scene_factory.controller_plant()
 num_robot_positions = controller_plant.num_positions()
 controller = builder.AddSystem(InverseDynamicsController(controller_plant, [150]*num_robot_positions, [50]*num_robot_positions, [50]*num_robot_positions, True))  # True = exposes "desired_acceleration" port
 builder.Connect(station.GetOutputPort("kuka_state"), controller.GetInputPort("estimated_state"))
@@ -201,16 +194,7 @@ meshcat.StartRecording()
 set_up_scene(station, station_context, plant, plant_context, simulator, randomize_boxes, box_fall_runtime if randomize_boxes else 0, box_randomization_runtime if randomize_boxes else 0)
 
 # Generate regions with no obstacles at all
-robot_diagram_builder = RobotDiagramBuilder()
-robot_model_instances = robot_diagram_builder.parser().AddModelsFromString(scenario_yaml_for_iris, ".dmd.yaml")
-robot_diagram_builder_plant = robot_diagram_builder.plant()
-robot_diagram_builder_diagram = robot_diagram_builder.Build()
-
-collision_checker_params = {}
-collision_checker_params["robot_model_instances"] = robot_model_instances
-collision_checker_params["model"] = robot_diagram_builder_diagram
-collision_checker_params["edge_step_size"] = 0.25
-collision_checker = SceneGraphCollisionChecker(**collision_checker_params)
+collision_checker = scene_factory.collision_checker("iris", edge_step_size=0.25)
 config_obstacle_collision_checker = ConfigurationSpaceObstacleCollisionChecker(collision_checker, [])
 
 # region_generator = IrisRegionGenerator(meshcat, config_obstacle_collision_checker, "../data/iris_source_regions_v2.yaml", DEBUG=True)
@@ -219,18 +203,25 @@ config_obstacle_collision_checker = ConfigurationSpaceObstacleCollisionChecker(c
 # region_generator = IrisRegionGenerator(meshcat, config_obstacle_collision_checker, "../data/iris_source_regions.yaml", DEBUG=True)
 region_generator = IrisRegionGenerator(meshcat, config_obstacle_collision_checker, "../data/iris_source_regions_modified_algorithm_num_points_per_visibility_round=1000.yaml", DEBUG=True)
 # region_generator.load_and_test_regions()
+# region_generator.prune_saved_regions(SampleBank(region_generator.cached_collision_checker), max_coverage_loss=0.01)
 # region_generator.generate_source_region_at_q_nominal(q_nominal)
 # region_generator.generate_source_iris_regions(minimum_clique_size=10,
 #                                                 coverage_threshold=0.5, 
 #                                                 num_points_per_visibility_round=1000,
 #                                                 use_previous_saved_regions=True)
 
-# for i in range(100):
-#     print(f"Beginning Clique Covers Iteration {i}.")
-#     region_generator.generate_source_iris_regions(minimum_clique_size=10,
-#                                                   coverage_threshold=0.1, 
-#                                                   num_points_per_visibility_round=i*75 + 50,
-#                                                   use_previous_saved_regions=True)
+# scheduler = VisibilityRoundScheduler(region_generator, SampleBank(region_generator.cached_collision_checker),
+#                                      min_gain_rate=1e-4,
+#                                      initial_num_points=50,
+#                                      initial_minimum_clique_size=10,
+#                                      seeding_mode="uncovered")
+# scheduler.run(coverage_threshold=0.1, use_previous_saved_regions=True)
+
+# region_generator.generate_source_iris_regions(minimum_clique_size=10,
+#                                               num_points_per_visibility_round=500,
+#                                               use_previous_saved_regions=True,
+#                                               seeding_mode="task_space")
+# region_generator.close()  # Shuts down the task-space seeding worker pool, if any
 
 # for i in range(10):
 #     print(f"Beginning Clique Covers Iteration {i}.")
@@ -240,54 +231,25 @@ region_generator = IrisRegionGenerator(meshcat, config_obstacle_collision_checke
 #                                                   use_previous_saved_regions=True)
 
 # Generate regions with box in eef
-robot_diagram_builder = RobotDiagramBuilder()
-scenario_yaml_for_iris_eef_box = scenario_yaml_for_iris + f"""
-- add_model: 
-    name: Boxes/Box_eef
-    file: file://{absolute_path_to_box}
-"""
-robot_model_instances = robot_diagram_builder.parser().AddModelsFromString(scenario_yaml_for_iris_eef_box, ".dmd.yaml")
-robot_diagram_builder_scene_graph = robot_diagram_builder.scene_graph()
-robot_diagram_builder_plant = robot_diagram_builder.plant()
-
-# Set pose of box to be in "grabbed" position relative to eef and weld it there
-eef_model_idx = robot_diagram_builder_plant.GetModelInstanceByName("kuka")  # ModelInstanceIndex
-eef_body_idx = robot_diagram_builder_plant.GetBodyIndices(eef_model_idx)[-1]  # BodyIndex
-frame_parent = robot_diagram_builder_plant.get_body(eef_body_idx).body_frame()
-# frame_parent = robot_diagram_builder_plant.GetBodyByName("arm_eef").body_frame()  # Equivalent
-box_model_idx = robot_diagram_builder_plant.GetModelInstanceByName("Boxes/Box_eef")  # ModelInstanceIndex
-box_body_idx = robot_diagram_builder_plant.GetBodyIndices(box_model_idx)[0]  # BodyIndex
-frame_child = robot_diagram_builder_plant.get_body(box_body_idx).body_frame()
-robot_diagram_builder_plant.AddJoint(WeldJoint("box-eef", frame_parent, frame_child, RigidTransform([-BOX_DIM/2, -BOX_DIM/2, BOX_DIM*1.3])))
-robot_diagram_builder_plant.Finalize()
-
 # Visualize IRIS scene
 print("IRIS Scene Meshcat:")
 iris_meshcat = StartMeshcat()
-AddDefaultVisualization(robot_diagram_builder.builder(), meshcat=iris_meshcat)
-
-robot_diagram_builder_diagram = robot_diagram_builder.Build()
+robot_diagram_builder_diagram, _, _, _ = scene_factory.iris_eef_box_diagram(meshcat=iris_meshcat)
 
 iris_simulator = Simulator(robot_diagram_builder_diagram)
 iris_simulator.AdvanceTo(0.001)
 
-collision_checker_params = {}
-collision_checker_params["robot_model_instances"] = robot_model_instances
-collision_checker_params["model"] = robot_diagram_builder_diagram
-collision_checker_params["edge_step_size"] = 0.25
-collision_checker = SceneGraphCollisionChecker(**collision_checker_params)
-collision_checker.SetCollisionFilteredBetween(eef_body_idx, box_body_idx, True)  # Filter collision between eef and box so IRIS doesn't fail immediately
+collision_checker = scene_factory.collision_checker("iris_eef_box", edge_step_size=0.25)  # Collision between eef and box is filtered
 config_obstacle_collision_checker = ConfigurationSpaceObstacleCollisionChecker(collision_checker, [])
 
 region_generator = IrisRegionGenerator(meshcat, config_obstacle_collision_checker, "../data/iris_source_regions_place_v2.yaml", DEBUG=True)
 # region_generator.load_and_test_regions(name="regions_place")
 # region_generator.generate_source_region_at_q_nominal(q_place_nominal)
-# for i in range(100):
-#     print(f"Beginning Clique Covers Iteration {i}.")
-#     region_generator.generate_source_iris_regions(minimum_clique_size=7,
-#                                                   coverage_threshold=0.1, 
-#                                                   num_points_per_visibility_round=i*75 + 50,
-#                                                   use_previous_saved_regions=True)
+# scheduler = VisibilityRoundScheduler(region_generator, SampleBank(region_generator.cached_collision_checker),
+#                                      min_gain_rate=1e-4,
+#                                      initial_num_points=50,
+#                                      initial_minimum_clique_size=7)
+# scheduler.run(coverage_threshold=0.1, use_previous_saved_regions=True)
 
 # Get box poses to pass to pick planner to select a box to pick first
 box_poses = {}
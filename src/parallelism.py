@@ -0,0 +1,85 @@
+"""
+One parallelism setting shared across the pipeline: the collision checkers'
+implicit-context parallelism, the clique cover options, Drake's batched
+queries (VisibilityGraph, CheckConfigsCollisionFree, CheckEdgesCollisionFree),
+and our own Python batch paths (region post-processing, task-space seeding,
+batch IK).
+
+Set it once at startup, i.e.
+
+    set_parallelism(ParallelismConfig(num_workers=32))
+
+before building any collision checkers.
+"""
+from pydrake.all import (
+    Parallelism,
+)
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+
+
+class ParallelismConfig():
+    """
+    num_workers is the number of threads Drake may use and the number of
+    workers in our own pools (defaults to the number of CPUs).
+
+    backend selects "processes" or "threads" for our own Python worker pools.
+    Processes avoid the GIL (most of our per-item work, i.e. IK solves and
+    LPs, is called from Python); threads avoid the per-worker start-up cost but
+    need per-thread plant contexts (i.e. BatchIK's per-worker IK plant).
+    """
+    def __init__(self, num_workers=None, backend="processes"):
+        if backend not in ("processes", "threads"):
+            raise ValueError(f"Unknown parallelism backend '{backend}'.")
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.backend = backend
+
+
+    def drake_parallelism(self):
+        return Parallelism(self.num_workers)
+
+
+    def apply_to_checker_params(self, collision_checker_params):
+        """
+        Set the number of per-thread contexts a SceneGraphCollisionChecker
+        allocates (and so the parallelism of its batched queries).
+        """
+        collision_checker_params["implicit_context_parallelism"] = self.drake_parallelism()
+        return collision_checker_params
+
+
+    def apply_to_clique_cover_options(self, options):
+        options.parallelism = self.drake_parallelism()
+        return options
+
+
+    def make_executor(self, initializer=None, initargs=(), max_workers=None, backend=None):
+        """
+        Create a worker pool for our own batch paths. initializer is called
+        once in each worker (i.e. to build a per-worker plant and context).
+
+        backend overrides the configured backend for this pool.
+        """
+        if max_workers is None:
+            max_workers = self.num_workers
+        if backend is None:
+            backend = self.backend
+        if backend == "threads":
+            return ThreadPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+
+
+_parallelism = None
+
+
+def get_parallelism():
+    global _parallelism
+    if _parallelism is None:
+        _parallelism = ParallelismConfig()
+    return _parallelism
+
+
+def set_parallelism(config):
+    global _parallelism
+    _parallelism = config
@@ -2,7 +2,6 @@ from pydrake.all import (
     RigidTransform,
     RotationMatrix,
     VPolytope,
-    StartMeshcat,
     Rgba,
     Point,
     Sphere,
@@ -17,8 +16,12 @@ import time
 from scipy.spatial import ConvexHull
 import matplotlib.pyplot as plt
 
-from scenario import NUM_BOXES, BOX_DIM, GRIPPER_DIM, PREPICK_MARGIN, GRIPPER_THICKNESS
-from utils import ik
+from scenario import NUM_BOXES, BOX_DIM, GRIPPER_DIM
+from batch_ik import BatchIK
+from ik_cache import IKCache
+from debug import DebugVisualizer
+from box_overlap import stack_poses, box_footprints, overlapping_pairs, support_pairs
+from grasp_poses import pre_pick_poses, pick_poses
 
 
 class BoxSelectorGraph:
@@ -93,26 +96,61 @@ class BoxSelectorGraph:
                 heapq.heappush(self.removable_boxes_heap, (box_x_coord, node))
         
 
-    def remove_next_node(self):
+    def is_removable(self, node):
+        return node in self.adj_list and len(self.adj_list[node]) == 0
+
+
+    def push_if_removable(self, node):
         """O(log(n))"""
+        if self.is_removable(node):
+            heapq.heappush(self.removable_boxes_heap, (node[1].translation()[0], node))
+
+
+    def remove_next_node(self):
+        """O(log(n)) amortized"""
+        # Skip stale heap entries (nodes that were removed, or that have had boxes placed above them, since being pushed)
+        while len(self.removable_boxes_heap) > 0 and not self.is_removable(self.removable_boxes_heap[0][1]):
+            heapq.heappop(self.removable_boxes_heap)
+
         if len(self.removable_boxes_heap) == 0:
             print("Unable to find a box without boxes above it that can be picked.")
             return None
         
         # Find box to remove
         ret = heapq.heappop(self.removable_boxes_heap)[1]  # [1] so we return the (BodyIndex, RigidTransform) tuple only (ignoring the x-coord)
+        self.remove_box(ret)
+        return ret
+
 
+    def remove_box(self, node):
+        """
+        O(number of parents * log(n)). Remove any node from the graph (not
+        necessarily the next one in the heap, i.e. if the box was moved).
+        """
         # Find, if after this box is removed, if there are any new boxes that
         # have been exposed and could now be removed, and add them to the heap
-        if ret in self.reverse_adj_list:
-            for parent in self.reverse_adj_list[ret]:
+        if node in self.reverse_adj_list:
+            for parent in self.reverse_adj_list[node]:
                 if len(self.adj_list[parent]) == 1:  # The only box above `parent` is the one about to be removed
                     parent_x_coord = parent[1].translation()[0]
                     heapq.heappush(self.removable_boxes_heap, (parent_x_coord, parent))
 
         # Remove its node from the graph
-        self.remove_node(ret)
-        return ret
+        self.remove_node(node)
+
+
+    def removable_nodes(self):
+        """
+        O(n log(n)). Nodes with no children, in heap order (minimum
+        x-coordinate first), without removing them.
+        """
+        nodes = []
+        seen = set()
+        for _, node in sorted(self.removable_boxes_heap, key=lambda entry: entry[0]):
+            if self.is_removable(node) and node not in seen:
+                nodes.append(node)
+                seen.add(node)
+        return nodes
 
 
     def __str__(self):
@@ -124,13 +162,69 @@ class PickPlanner():
     A class to manage all picking logic, i.e. selecting which boxes are viable
     to be picked at the current time.
     """
-    def __init__(self, meshcat, robot_pose, box_body_indices, ik_plant, ik_plant_context, DEBUG=True):
+    def __init__(self, meshcat, robot_pose, box_body_indices, ik_plant, ik_plant_context, DEBUG=True, ik_cache=None,
+                 position_tolerance=0.01, rotation_tolerance=0.01, debug_period=0.0, reachability_map=None,
+                 num_pick_targets=6, candidate_batch_size=None, box_order_weight=1.0, face_weight=1.0, distance_weight=0.5,
+                 ik_num_workers=1):
+        """
+        ik_cache is an optional IKCache (i.e. backed by a file, so the deposit
+        pose is not re-solved on every startup); by default, results are only
+        cached in memory.
+
+        DEBUG enables the debug visualization (of box projections, viable
+        boxes and pick poses), drawn at most once every debug_period seconds.
+
+        position_tolerance (in m) and rotation_tolerance (on rotation matrix
+        entries) are how far a box has to move between pick cycles for its
+        support relations to be re-evaluated.
+
+        reachability_map is an optional ReachabilityMap; pick pose candidates
+        in unreachable cells are discarded without running IK.
+
+        num_pick_targets is how many feasible pre-pick poses to find per pick
+        cycle (None for every one); candidates are solved in batches of
+        candidate_batch_size in order of their score (see
+        score_pick_candidates(), with the given weights) until enough are
+        found. By default, candidates are solved one at a time in-process, or
+        one per worker if a pool is configured with ik_num_workers.
+
+        ik_num_workers is the number of threads pick pose candidates are
+        solved in; by default, they are solved in-process (a process pool must
+        not be forked from inside the running simulation).
+        """
         self.meshcat = meshcat
         self.robot_pose = robot_pose
         self.box_body_indices = box_body_indices
         self.plant = ik_plant
         self.plant_context = ik_plant_context
         self.DEBUG = DEBUG
+        self.debug_visualizer = DebugVisualizer(meshcat, enabled=DEBUG, min_period=debug_period)
+        self.projection_visualizer = DebugVisualizer(enabled=DEBUG, min_period=debug_period, setup=self.setup_projection_meshcat)  # Separate Meshcat, started once
+        self.batch_ik = BatchIK(num_workers=ik_num_workers, backend="threads", plant=ik_plant, plant_context=ik_plant_context)  # For pick pose candidates
+        self.ik_cache = ik_cache if ik_cache is not None else IKCache()
+        self.reachability_map = reachability_map
+        self.num_pick_targets = num_pick_targets
+        if candidate_batch_size is None:
+            candidate_batch_size = self.batch_ik.num_workers if self.batch_ik.num_workers > 1 else 1  # Only widen batches for an explicitly configured pool
+        self.candidate_batch_size = candidate_batch_size
+        self.box_order_weight = box_order_weight
+        self.face_weight = face_weight
+        self.distance_weight = distance_weight
+        self.fk_context = ik_plant.CreateDefaultContext()  # For the current end effector position when scoring candidates
+
+        # Support graph of the boxes in the pile, updated incrementally between pick cycles
+        self.position_tolerance = position_tolerance
+        self.rotation_tolerance = rotation_tolerance
+        self.support_graph = BoxSelectorGraph()
+        self.support_graph_nodes = {}  # Maps BodyIndex to its (BodyIndex, RigidTransform) node in the support graph
+        self.picked_boxes = set()  # BodyIndex of every box removed from the pile
+
+
+    @staticmethod
+    def setup_projection_meshcat(meshcat):
+        print(f"Box Projection Visualization Meshcat: {meshcat.web_url()}")
+        meshcat.Set2dRenderMode(RigidTransform([0, 0, 1]), -4, 4, -4, 4)
+        meshcat.SetProperty("/Axes", "visible", True)
 
 
     def sort_vertices_ccw(self, vpolytope: VPolytope) -> np.ndarray:
@@ -172,7 +266,7 @@ class PickPlanner():
         """
         self.X_W_Deposit = RigidTransform(RotationMatrix.MakeXRotation(3.14159265), self.robot_pose.translation() + [0.0, -0.65, 1.25])
         AddMeshcatTriad(self.meshcat, "X_W_Deposit", X_PT=self.X_W_Deposit, opacity=0.5)
-        q, _ = ik(self.plant, self.plant_context, self.X_W_Deposit, regions=source_regions_place)
+        q, _ = self.ik_cache.ik(self.plant, self.plant_context, self.X_W_Deposit, regions=source_regions_place)
         return q
     
 
@@ -184,12 +278,92 @@ class PickPlanner():
         pose.
         """
         # Offset the pre-pick pose by the PREPICK_MARGIN toward the box to get the pick pose
-        pick_pose = RigidTransform(pre_pick_pose.rotation(), pre_pick_pose.translation() + pre_pick_pose.rotation() @ [0, 0, PREPICK_MARGIN - GRIPPER_THICKNESS])
-        q, _ = ik(self.plant, self.plant_context, pick_pose)
+        pick_pose = RigidTransform(pick_poses(pre_pick_pose.GetAsMatrix4()))
+        q, _ = self.ik_cache.ik(self.plant, self.plant_context, pick_pose)
         return q
 
 
-    def get_viable_pick_poses(self, box_poses, source_regions):
+    def update_support_graph(self, box_poses):
+        """
+        Update the support graph with the current box poses (a dictionary
+        mapping box BodyIndex to RigidTransform). Only boxes that are new or
+        have moved beyond the tolerances since the last update have their
+        support relations re-evaluated (against every box in the pile).
+        """
+        start = time.time()
+        graph = self.support_graph
+        for box_body_idx in list(self.support_graph_nodes.keys()):
+            if box_body_idx in self.picked_boxes or box_body_idx not in box_poses:
+                graph.remove_box(self.support_graph_nodes.pop(box_body_idx))
+
+        box_body_indices = [box_body_idx for box_body_idx in box_poses.keys() if box_body_idx not in self.picked_boxes]
+        if len(box_body_indices) == 0:
+            return
+        rotations, translations = stack_poses([box_poses[box_body_idx] for box_body_idx in box_body_indices])
+        moved = np.ones(len(box_body_indices), dtype=bool)
+        for k, box_body_idx in enumerate(box_body_indices):
+            node = self.support_graph_nodes.get(box_body_idx)
+            if node is not None:
+                moved[k] = np.max(np.abs(node[1].translation() - translations[k])) > self.position_tolerance or \
+                           np.max(np.abs(node[1].rotation().matrix() - rotations[k])) > self.rotation_tolerance
+
+        # Re-add moved boxes at their new poses
+        for k in np.flatnonzero(moved):
+            box_body_idx = box_body_indices[k]
+            if box_body_idx in self.support_graph_nodes:
+                graph.remove_box(self.support_graph_nodes[box_body_idx])
+            node = (box_body_idx, RigidTransform(box_poses[box_body_idx]))
+            self.support_graph_nodes[box_body_idx] = node
+            graph.add_node(node)
+
+        # Support relations between moved boxes and every box (with the poses stored in the graph)
+        if np.any(moved):
+            graph_poses = [self.support_graph_nodes[box_body_idx][1] for box_body_idx in box_body_indices]
+            rotations, translations = stack_poses(graph_poses)
+            centers, edges = box_footprints(rotations, translations)
+            pairs = overlapping_pairs(centers, edges)
+            pairs = pairs[moved[pairs[:, 0]] | moved[pairs[:, 1]]]  # Relations between unmoved boxes are already in the graph
+            for lower, upper in support_pairs(translations[:, 2], pairs):
+                graph.add_edge(self.support_graph_nodes[box_body_indices[lower]], self.support_graph_nodes[box_body_indices[upper]])
+            for k in np.flatnonzero(moved):
+                graph.push_if_removable(self.support_graph_nodes[box_body_indices[k]])
+
+        print(f"Support graph: {np.sum(moved)}/{len(box_body_indices)} boxes re-evaluated in {time.time() - start:.3f}s.")
+
+
+    def mark_picked(self, box_body_idx):
+        """
+        Remove a box from the pile (i.e. once it has been grabbed), exposing
+        the boxes below it.
+        """
+        self.picked_boxes.add(box_body_idx)
+        if box_body_idx in self.support_graph_nodes:
+            self.support_graph.remove_box(self.support_graph_nodes.pop(box_body_idx))
+
+
+    def score_pick_candidates(self, box_ranks, poses, q_current=None):
+        """
+        Cheap heuristic scores (lower is better) for pick candidates, given
+        their boxes' (M,) positions in the removal order (minimum x-coordinate
+        first, so the pile is cleared front to back) and their (M, 4, 4)
+        pre-pick poses: a weighted sum of
+         - the box's position in the removal order,
+         - how far the approach direction is from the preferred ones (pushing
+           into the front face, or down onto the top face),
+         - the distance from the current end effector position (if q_current
+           is given) to the pre-pick pose.
+        """
+        approaches = poses[:, :3, 2]
+        face_penalties = 1 - np.maximum(approaches @ [1, 0, 0], approaches @ [0, 0, -1])  # 0 for the preferred directions, up to 2
+        scores = self.box_order_weight * np.asarray(box_ranks, dtype=float) + self.face_weight * face_penalties
+        if q_current is not None:
+            self.plant.SetPositions(self.fk_context, q_current)
+            eef_position = self.plant.GetFrameByName("arm_eef").CalcPoseInWorld(self.fk_context).translation()
+            scores += self.distance_weight * np.linalg.norm(poses[:, :3, 3] - eef_position, axis=1)
+        return scores
+
+
+    def get_viable_pick_poses(self, box_poses, source_regions, q_current=None):
         """
         Return a dictionary mapping regions in configuration that are viable
         pick poses to tuples containing the corresponding box BodyIndex and pick
@@ -197,112 +371,76 @@ class PickPlanner():
 
         box_poses is a dictionary mapping box BodyIndex to RigidTransform
         representing their 3D pose.
+
+        q_current is the robot's current configuration (used to prioritize
+        nearby pick poses).
+
+        Candidates are solved lazily in priority order, and only until
+        num_pick_targets viable pre-pick poses are found.
         """
-        # Compute projections of boxes onto XY plane to more easily determine
-        # which are vertically overlapping
-        box_projections = {}  # dict mapping box bodyIndex to VPolytope XY projection
-        for box_body_idx, box_pose in box_poses.items():
-            # Find vertices of projection of box onto XY plane
-            box_corners = []
-            for dx in [0, BOX_DIM]:
-                for dy in [0, BOX_DIM]:
-                    for dz in [0, -BOX_DIM]:
-                        # Find coordinate of box corner in 3D
-                        box_corner = box_pose.translation() + box_pose.rotation() @ np.array([dx, dy, dz])
-                        # Project box corner into XY plane by removing Z coordinate
-                        box_corner_xy = np.array([box_corner[0], box_corner[1]])
-                        box_corners.append(box_corner_xy)
-
-            box_corners = np.array(box_corners)
-
-            # Only keep the points in the convex hull of the projection
-            box_hull = ConvexHull(box_corners)
-            box_points = box_corners[box_hull.vertices, :]
-            box_points = np.hstack((box_points, np.zeros((np.shape(box_points)[0], 1))))  # Append 0 z-coordinate
-            
-            box_projections[box_body_idx] = VPolytope(box_points.T)
+        # Determine which boxes are not covered by any others, using the
+        # support graph (from the boxes' projections onto the XY plane)
+        self.update_support_graph(box_poses)
+        box_body_indices = [box_body_idx for box_body_idx in box_poses.keys() if box_body_idx not in self.picked_boxes]
+        viable_boxes = [node[0] for node in self.support_graph.removable_nodes()]  # Minimum x-coordinate first
 
         # Render 2D projections in Meshcat
-        if self.DEBUG:
-            print("Box Projection Visualization Meshcat:")
-            meshcat = StartMeshcat()
-            meshcat.Set2dRenderMode(RigidTransform([0, 0, 1]), -4, 4, -4, 4)
-            meshcat.SetProperty("/Axes", "visible", True)
-            ctr = 0
-            for box_body_idx, vpoly in box_projections.items():
-                points = np.array(self.sort_vertices_ccw(vpoly))
+        if self.projection_visualizer.should_draw("projections"):
+            self.projection_visualizer.delete("projections")
+            rotations, translations = stack_poses([box_poses[box_body_idx] for box_body_idx in box_body_indices])
+            centers, edges = box_footprints(rotations, translations)
+            signs = np.array([[sx, sy, sz] for sx in [-0.5, 0.5] for sy in [-0.5, 0.5] for sz in [-0.5, 0.5]])
+            for ctr, box_body_idx in enumerate(box_body_indices):
+                corners = centers[ctr] + signs @ edges[ctr]
+                hull_corners = corners[ConvexHull(corners).vertices]  # Counter-clockwise
+                points = np.vstack((hull_corners, hull_corners[:1])).T
+                points = np.vstack((points, np.zeros(points.shape[1])))  # Append 0 z-coordinate
                 z = box_poses[box_body_idx].translation()[2]
-                meshcat.SetLine(f"vpoly_{ctr}", points, 2.0, Rgba(*(plt.cm.viridis(z / 2.0))))
-                ctr += 1
-
-        # Now, determine which boxes vertically overlap and remove any boxes that are in lower layers
-        viable_boxes = list(box_poses.keys())
-        for box_body_idx, box_proj in box_projections.items():
-            for other_box_body_idx, other_box_proj in box_projections.items():
-                # Box cannot be on top of itself
-                if box_body_idx == other_box_body_idx:
-                    continue
-                
-                # If boxes vertically overlap, figure out which one is above the
-                # other by looking at their z-coordinates. 
-                # Note: This isn't a perfect solution; i.e. one box can be on
-                # another but still have a lower z-coordinate; but this seems
-                # unlikely enough (and also I can't think of a perfect way to
-                # do this).
-                if box_proj.IntersectsWith(other_box_proj):
-                    if box_poses[box_body_idx].translation()[2] > box_poses[other_box_body_idx].translation()[2]:
-                        # box_body_idx is above other_box_body_idx
-                        try:
-                            viable_boxes.remove(other_box_body_idx)
-                        except:
-                            pass
+                self.projection_visualizer.set_line(f"projections/{box_body_idx}", points, 2.0, Rgba(*(plt.cm.viridis(z / 2.0))))
+            self.projection_visualizer.flush()
+
         print(f"{len(viable_boxes)} viable boxes to be picked found.")
-                        
-        if self.DEBUG:
+
+        draw_pick_poses = self.debug_visualizer.should_draw("pick_poses")
+        if draw_pick_poses:
+            # Remove viable boxes and pick poses drawn in the previous iteration
+            self.debug_visualizer.delete("Viable_Boxes")
+            self.debug_visualizer.delete("Pick_Poses")
             for box_body_idx in viable_boxes:
-                self.meshcat.SetObject(f"Viable_Boxes/{box_body_idx}", Box(BOX_DIM, BOX_DIM, BOX_DIM), Rgba(0.75, 0.0, 0.0))
-                self.meshcat.SetTransform(f"Viable_Boxes/{box_body_idx}", RigidTransform(box_poses[box_body_idx].rotation(), box_poses[box_body_idx].translation() + box_poses[box_body_idx].rotation() @ np.array([BOX_DIM/2, BOX_DIM/2, -BOX_DIM/2])))
-            # Remove drawn polytopes from previous iteration
-            for box_body_idx in self.box_body_indices:
-                for i in range(6):
-                    self.meshcat.Delete(f"Pick_Poses/{box_body_idx}_{i}")
-
-        # For each viable box, generate polytope of grasp poses for each face
-        # Also, display the polytope in meshcat
+                self.debug_visualizer.set_object(f"Viable_Boxes/{box_body_idx}", Box(BOX_DIM, BOX_DIM, BOX_DIM), Rgba(0.75, 0.0, 0.0))
+                self.debug_visualizer.set_transform(f"Viable_Boxes/{box_body_idx}", RigidTransform(box_poses[box_body_idx].rotation(), box_poses[box_body_idx].translation() + box_poses[box_body_idx].rotation() @ np.array([BOX_DIM/2, BOX_DIM/2, -BOX_DIM/2])))
+
+        # For each viable box, generate grasp poses for each face (all at once)
+        rotations, translations = stack_poses([box_poses[box_body_idx] for box_body_idx in viable_boxes])
+        candidate_poses = pre_pick_poses(rotations, translations).reshape(-1, 4, 4)
+        candidate_ranks, candidate_faces = np.divmod(np.arange(len(candidate_poses)), 6)  # Index into viable_boxes, face index
+
+        # Discard candidates in unreachable cells of the reachability map without running IK
+        if self.reachability_map is not None and len(candidate_poses) > 0:
+            promising = self.reachability_map.is_promising(candidate_poses)
+            print(f"Reachability map: {np.sum(promising)}/{len(candidate_poses)} pick pose candidates kept.")
+            candidate_poses, candidate_ranks, candidate_faces = candidate_poses[promising], candidate_ranks[promising], candidate_faces[promising]
+
+        # Solve IK for the candidates in order of their scores, a batch at a time (in parallel), until enough are found,
+        # reusing results for boxes that haven't moved. Also, display the viable poses in meshcat
+        order = np.argsort(self.score_pick_candidates(candidate_ranks, candidate_poses, q_current), kind="stable")
+        candidate_poses, candidate_ranks, candidate_faces = candidate_poses[order], candidate_ranks[order], candidate_faces[order]
         pick_regions = {}  # dict mapping Points to (BodyIndex, RigidTransform) tuples
-        for box_body_idx in viable_boxes:
-            box_pose = box_poses[box_body_idx]
-            box_center = RigidTransform(box_pose.rotation(), box_pose.translation() + box_pose.rotation() @ np.array([BOX_DIM/2, BOX_DIM/2, -BOX_DIM/2]))  # Because box_pose is at the corner of the box
-
-            # For all 6 faces of each box
-            for i in range(6):
-                if i == 0:
-                    p = box_center.translation() + box_pose.rotation() @ np.array([(BOX_DIM/2 + PREPICK_MARGIN), 0, 0])
-                    R = box_center.rotation() @ RotationMatrix.MakeYRotation(-np.pi/2)
-                elif i == 1:
-                    p = box_center.translation() + box_pose.rotation() @ np.array([-(BOX_DIM/2 + PREPICK_MARGIN), 0, 0])
-                    R = box_center.rotation() @ RotationMatrix.MakeYRotation(np.pi/2)
-                elif i == 2:
-                    p = box_center.translation() + box_pose.rotation() @ np.array([0, (BOX_DIM/2 + PREPICK_MARGIN), 0])
-                    R = box_center.rotation() @ RotationMatrix.MakeXRotation(np.pi/2)
-                elif i == 3:
-                    p = box_center.translation() + box_pose.rotation() @ np.array([0, -(BOX_DIM/2 + PREPICK_MARGIN), 0])
-                    R = box_center.rotation() @ RotationMatrix.MakeXRotation(-np.pi/2)
-                elif i == 4:
-                    p = box_center.translation() + box_pose.rotation() @ np.array([0, 0, (BOX_DIM/2 + PREPICK_MARGIN)])
-                    R = box_center.rotation() @ RotationMatrix.MakeXRotation(np.pi)
-                else:
-                    p = box_center.translation() + box_pose.rotation() @ np.array([0, 0, -(BOX_DIM/2 + PREPICK_MARGIN)])
-                    R = box_center.rotation()
-
-                X = RigidTransform(R, p)
-                q, ik_success = ik(self.plant, self.plant_context, X, regions=source_regions, pose_as_constraint=False)
-                if ik_success:
+        num_solved = 0
+        while num_solved < len(candidate_poses) and (self.num_pick_targets is None or len(pick_regions) < self.num_pick_targets):
+            batch = np.arange(num_solved, min(num_solved + self.candidate_batch_size, len(candidate_poses)))
+            num_solved += len(batch)
+            qs, ik_successes = self.ik_cache.batch_ik(self.batch_ik, candidate_poses[batch], regions=source_regions, pose_as_constraint=False, project_onto_regions=True)
+            for k, q, ik_success in zip(batch, qs, ik_successes):
+                if ik_success and (self.num_pick_targets is None or len(pick_regions) < self.num_pick_targets):
+                    box_body_idx, i, X = viable_boxes[candidate_ranks[k]], candidate_faces[k], RigidTransform(candidate_poses[k])
                     pick_regions[Point(q)] = (box_body_idx, X)
-                    if self.DEBUG:
-                        self.meshcat.SetObject(f"Pick_Poses/{box_body_idx}_{i}", Sphere(0.03), Rgba(0.75, 0.0, 0.0))
-                        self.meshcat.SetTransform(f"Pick_Poses/{box_body_idx}_{i}", X)
-                        AddMeshcatTriad(self.meshcat, f"Pick_Poses/{box_body_idx}_pose_{i}", X_PT=X, opacity=0.5)
+                    if draw_pick_poses:
+                        self.debug_visualizer.set_object(f"Pick_Poses/{box_body_idx}_{i}", Sphere(0.03), Rgba(0.75, 0.0, 0.0))
+                        self.debug_visualizer.set_transform(f"Pick_Poses/{box_body_idx}_{i}", X)
+                        self.debug_visualizer.add_triad(f"Pick_Poses/{box_body_idx}_pose_{i}", X, opacity=0.5)
+        self.debug_visualizer.flush()
 
+        print(f"Solved IK for {num_solved}/{len(candidate_poses)} pick pose candidates.")
         print(f"{len(pick_regions)} viable pre-pick poses found.")
         return pick_regions
\ No newline at end of file
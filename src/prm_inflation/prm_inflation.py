@@ -30,6 +30,9 @@ from station import MakeHardwareStation, load_scenario
 from scenario import scenario_yaml_for_iris
 from iris import IrisRegionGenerator
 from utils import ik
+from collision_cache import CachedCollisionChecker
+from edge_cache import EdgeResultStore, build_prm, scene_fingerprint
+from parallelism import get_parallelism
 
 import numpy as np
 import importlib
@@ -77,8 +80,10 @@ collision_checker_params = {}
 collision_checker_params["robot_model_instances"] = robot_model_instances
 collision_checker_params["model"] = diagram
 collision_checker_params["edge_step_size"] = 0.125
+get_parallelism().apply_to_checker_params(collision_checker_params)
 collision_checker = SceneGraphCollisionChecker(**collision_checker_params)
 cspace_obstacle_collision_checker = ConfigurationSpaceObstacleCollisionChecker(collision_checker, [])
+cached_collision_checker = CachedCollisionChecker(cspace_obstacle_collision_checker)
 
 # Sample to build PRM
 N = 1000
@@ -88,7 +93,7 @@ last_polytope_sample = domain.UniformSample(rng, domain.ChebyshevCenter())
 for i in range(np.shape(points)[1]):
     last_polytope_sample = domain.UniformSample(rng, last_polytope_sample)
 
-    while not cspace_obstacle_collision_checker.CheckConfigCollisionFree(last_polytope_sample):
+    while not cached_collision_checker.CheckConfigCollisionFree(last_polytope_sample):
         last_polytope_sample = domain.UniformSample(rng, last_polytope_sample)
 
     points[:, i] = last_polytope_sample
@@ -96,7 +101,11 @@ for i in range(np.shape(points)[1]):
 # Build PRM
 RADIUS = np.pi/4  # Radians
 print(np.shape(points))
-prm = PRM(cspace_obstacle_collision_checker, points, RADIUS)
+edge_store = EdgeResultStore(os.path.dirname(os.path.abspath(__file__)) + f"/../../data/prm_edges_{TEST_SCENE}.pkl")
+prm = build_prm(cspace_obstacle_collision_checker, points, RADIUS, edge_store, scene_fingerprint(collision_checker, scenario_yaml_for_iris if TEST_SCENE == "BOXUNLOADING" else scene_yaml_file))
+prm = prm.tolil()  # Edges are removed below as they are followed
+edge_store.print_stats()
+edge_store.save()
 
 print(prm)
 
@@ -141,5 +150,7 @@ while cspace_coverage < COVERAGE_THRESH:
 
     cspace_coverage = iris_gen.estimate_coverage(regions, num_samples=500)
 
+iris_gen.cached_collision_checker.print_stats()  # Coverage estimates reuse the same fixed-seed samples every iteration
+
 # Visualize IRIS regions
 iris_gen.test_iris_region(plant, plant_context, meshcat, regions)
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Offline grasp reachability map for the trailer workspace.
+
+PickPlanner used to find out whether a pre-pick pose is reachable only by
+running IK on it. ReachabilityMap precomputes IK over a voxel grid of the
+trailer interior, for each of the 6 pre-pick orientations of an axis-aligned
+box's faces (see grasp_poses.py), storing whether IK succeeded. Pre-pick poses
+are then looked up by voxel and by the nearest of the 6 approach directions
+(the end effector z-axis), so faces in unreachable cells can be discarded
+without running IK.
+
+The map file records the grid (bounds and resolution) it was built on, so the
+runtime only needs to check that the region files haven't changed.
+
+The map is approximate (rotations about the approach direction and offsets
+within a voxel are ignored), so a cell counts as reachable if it or any
+neighboring cell with the same approach direction is.
+"""
+from scipy.ndimage import binary_dilation
+from pathlib import Path
+import numpy as np
+import os
+import pickle
+import time
+
+from scenario import TRAILER_INTERIOR_LOWER, TRAILER_INTERIOR_UPPER
+from ik_cache import files_fingerprint
+from box_overlap import stack_poses
+from grasp_poses import FACE_ROTATIONS, APPROACH_DIRECTIONS, homogeneous
+
+
+class ReachabilityMap():
+    """
+    Voxel grid x 6 approach directions of precomputed IK results.
+    """
+    FORMAT_VERSION = 2
+
+    def __init__(self, lower=TRAILER_INTERIOR_LOWER, upper=TRAILER_INTERIOR_UPPER, resolution=0.25):
+        self.lower = np.array(lower, dtype=float)
+        self.upper = np.array(upper, dtype=float)
+        self.resolution = resolution
+        self.shape = tuple(np.ceil((self.upper - self.lower) / resolution).astype(int))
+
+        self.success = np.zeros(self.shape + (6,), dtype=bool)
+        self.reachable = np.zeros(self.shape + (6,), dtype=bool)  # success, dilated to neighboring cells
+
+
+    def voxel_centers(self):
+        """
+        Returns an (nx, ny, nz, 3) np array.
+        """
+        axes = [self.lower[d] + (np.arange(self.shape[d]) + 0.5) * self.resolution for d in range(3)]
+        return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1)
+
+
+    def build(self, batch_ik, regions):
+        """
+        Solve IK (with batch_ik, a BatchIK) for every voxel center and face
+        orientation, with the pose as a constraint: a cell is only reachable
+        if the pose is actually reached by a configuration in one of the
+        regions (the pick pose candidates themselves are solved with the pose
+        as a cost and projected onto the regions, which almost always
+        "succeeds").
+
+        regions is a dictionary mapping region names to HPolyhedrons.
+        """
+        start = time.time()
+        centers = self.voxel_centers().reshape(-1, 3)
+        poses = homogeneous(FACE_ROTATIONS, np.broadcast_to(centers[:, None, :], (len(centers), 6, 3))).reshape(-1, 4, 4)
+        print(f"ReachabilityMap: solving IK for {len(poses)} poses ({len(centers)} voxels x 6 approach directions).")
+        _, successes = batch_ik.solve(poses, regions=regions)
+
+        self.success = successes.reshape(self.shape + (6,))
+        self.reachable = binary_dilation(self.success, structure=np.ones((3, 3, 3, 1), dtype=bool))
+        print(f"ReachabilityMap: {np.sum(self.success)}/{self.success.size} cells reachable; built in {time.time() - start:.2f}s.")
+
+
+    def lookup(self, poses):
+        """
+        poses is a list of N RigidTransforms or an (N, 4, 4) np array
+        (pre-pick poses).
+
+        Returns an (N,) boolean np array of which poses lie in the grid, and
+        an (N, 4) np array of their (voxel index, approach direction index)
+        cell indices (clipped to the grid).
+        """
+        rotations, translations = stack_poses(poses)
+        approaches = rotations[:, :, 2]
+        voxels = np.floor((translations - self.lower) / self.resolution).astype(int)
+        in_grid = np.all((voxels >= 0) & (voxels < self.shape), axis=1)
+        voxels = np.clip(voxels, 0, np.array(self.shape) - 1)
+        directions = np.argmax(approaches @ APPROACH_DIRECTIONS.T, axis=1)
+        return in_grid, np.column_stack((voxels, directions))
+
+
+    def is_promising(self, poses):
+        """
+        Returns an (N,) boolean np array of which poses are worth running IK
+        for, i.e. lie outside the grid or in a reachable cell.
+        """
+        in_grid, cells = self.lookup(poses)
+        return ~in_grid | self.reachable[tuple(cells.T)]
+
+
+    def has_grid(self, lower, upper, resolution):
+        """
+        Whether the map was built on the grid with the given bounds and
+        resolution.
+        """
+        return np.allclose(self.lower, lower) and np.allclose(self.upper, upper) and np.isclose(self.resolution, resolution)
+
+
+    @staticmethod
+    def load(file, regions_files):
+        """
+        Load the map from file (a pickle) if it exists and was built from the
+        same region files; otherwise return None. The grid is the one the map
+        was built on.
+        """
+        file = Path(file)
+        if not file.exists():
+            print(f"ReachabilityMap: {file} not found.")
+            return None
+        with open(file, "rb") as f:
+            saved = pickle.load(f)
+        if saved.get("version") != ReachabilityMap.FORMAT_VERSION:
+            print(f"ReachabilityMap: {file} is from an older version.")
+            return None
+        if saved["regions_files_fingerprint"] != files_fingerprint(regions_files):
+            print(f"ReachabilityMap: region files changed since {file} was built.")
+            return None
+        print(f"ReachabilityMap: loaded from {file} (resolution {saved['resolution']} m).")
+        return saved["map"]
+
+
+    @staticmethod
+    def load_or_build(file, batch_ik, regions, regions_files, lower=TRAILER_INTERIOR_LOWER, upper=TRAILER_INTERIOR_UPPER, resolution=0.25):
+        """
+        Load the map from file (see load()); if it is missing, stale, or built
+        on a different grid, build it and save it to file (along with its
+        grid). Building solves IK for every cell, so this should only be
+        called offline (see build_reachability_map.py).
+        """
+        reachability_map = ReachabilityMap.load(file, regions_files)
+        if reachability_map is not None and reachability_map.has_grid(lower, upper, resolution):
+            return reachability_map
+
+        file = Path(file)
+        reachability_map = ReachabilityMap(lower, upper, resolution)
+        reachability_map.build(batch_ik, regions)
+        tmp_file = file.with_suffix(file.suffix + ".tmp")
+        with open(tmp_file, "wb") as f:
+            pickle.dump({"version": ReachabilityMap.FORMAT_VERSION, "regions_files_fingerprint": files_fingerprint(regions_files),
+                         "lower": reachability_map.lower, "upper": reachability_map.upper, "resolution": resolution,
+                         "map": reachability_map}, f)
+        os.replace(tmp_file, file)  # Atomic so an interrupted build can't leave a corrupt map
+        return reachability_map
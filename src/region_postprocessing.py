@@ -0,0 +1,105 @@
+"""
+Batched post-processing of IRIS regions. The per-region operations here
+(ReduceInequalities() and SimplifyByIncrementalFaceTranslation()) each solve
+many small LPs and are independent across regions, so they are spread over a
+worker pool (see parallelism.py).
+
+HPolyhedrons are passed to and from the workers as (A, b) np arrays.
+"""
+from pydrake.all import (
+    HPolyhedron,
+)
+
+import time
+
+from parallelism import get_parallelism
+
+
+def _reduce_inequalities_worker(A, b):
+    start = time.time()
+    reduced = HPolyhedron(A, b).ReduceInequalities()
+    return reduced.A(), reduced.b(), time.time() - start
+
+
+def _simplify_worker(A, b, intersecting_Abs, min_volume_ratio, max_iterations, random_seed):
+    start = time.time()
+    intersecting_polytopes = [HPolyhedron(A_, b_) for A_, b_ in intersecting_Abs]
+    simplified = HPolyhedron(A, b).SimplifyByIncrementalFaceTranslation(min_volume_ratio=min_volume_ratio,
+                                                                        max_iterations=max_iterations,
+                                                                        intersecting_polytopes=intersecting_polytopes,
+                                                                        random_seed=random_seed)
+    return simplified.A(), simplified.b(), time.time() - start
+
+
+def _run(worker, args_list, num_workers):
+    if num_workers is None:
+        num_workers = get_parallelism().num_workers
+    if num_workers <= 1 or len(args_list) <= 1:
+        return [worker(*args) for args in args_list]
+    with get_parallelism().make_executor(max_workers=min(num_workers, len(args_list))) as executor:
+        futures = [executor.submit(worker, *args) for args in args_list]
+        return [f.result() for f in futures]  # Preserve input order
+
+
+def _collect(names, regions, results, operation, verbose):
+    """
+    Convert worker results back to HPolyhedrons and build per-region stats.
+    """
+    output_regions = []
+    stats = []
+    for name, r, (A, b, runtime) in zip(names, regions, results):
+        output_regions.append(HPolyhedron(A, b))
+        stats.append({"name": name, "runtime": runtime, "faces_before": r.A().shape[0], "faces_after": A.shape[0]})
+
+    if verbose:
+        for s in stats:
+            print(f"{operation}: {s['name']}: {s['faces_before']} -> {s['faces_after']} faces in {s['runtime']:.3f}s.")
+        faces_before = sum(s["faces_before"] for s in stats)
+        faces_after = sum(s["faces_after"] for s in stats)
+        total_runtime = sum(s["runtime"] for s in stats)
+        print(f"{operation}: {len(stats)} regions: {faces_before} -> {faces_after} faces; {total_runtime:.2f}s of worker time.")
+
+    return output_regions, stats
+
+
+def batch_reduce_inequalities(regions, names=None, num_workers=None, verbose=True):
+    """
+    Run ReduceInequalities() on every region in parallel.
+
+    regions is a list of HPolyhedrons.
+
+    names is an optional list of labels (used when reporting stats).
+
+    num_workers defaults to the shared parallelism setting; 1 runs serially
+    in-process.
+
+    Returns the list of reduced HPolyhedrons (in input order) and a list of
+    per-region stat dicts with keys "name", "runtime", "faces_before", and
+    "faces_after".
+    """
+    if names is None:
+        names = [f"region {i}" for i in range(len(regions))]
+    args_list = [(r.A(), r.b()) for r in regions]
+    results = _run(_reduce_inequalities_worker, args_list, num_workers)
+    return _collect(names, regions, results, "ReduceInequalities", verbose)
+
+
+def batch_simplify_by_incremental_face_translation(regions, intersecting_polytopes, names=None, min_volume_ratio=0.1, max_iterations=1, random_seed=42, num_workers=None, verbose=True):
+    """
+    Run SimplifyByIncrementalFaceTranslation() on every region in parallel.
+
+    regions is a list of HPolyhedrons.
+
+    intersecting_polytopes is a list (the same length as regions) of lists of
+    HPolyhedrons whose intersection with the corresponding region must be
+    preserved by the simplification.
+
+    Returns the list of simplified HPolyhedrons (in input order) and a list of
+    per-region stat dicts (see batch_reduce_inequalities()).
+    """
+    if names is None:
+        names = [f"region {i}" for i in range(len(regions))]
+    args_list = [(r.A(), r.b(), [(r_.A(), r_.b()) for r_ in intersecting], min_volume_ratio, max_iterations, random_seed)
+                 for r, intersecting in zip(regions, intersecting_polytopes)]
+    results = _run(_simplify_worker, args_list, num_workers)
+    return _collect(names, regions, results, "SimplifyByIncrementalFaceTranslation", verbose)
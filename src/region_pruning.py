@@ -0,0 +1,111 @@
+"""
+Prune redundant IRIS regions, i.e. regions that are fully or almost fully
+contained in the union of other regions. Every extra region adds a vertex (and
+edges) to the GCS graph, so a smaller region set directly speeds up online
+planning in MotionPlanner.perform_gcs_traj_opt().
+"""
+import numpy as np
+
+
+def region_adjacency(regions):
+    """
+    Returns a list of sets, where entry i contains the indices of the regions
+    that intersect regions[i].
+    """
+    adjacency = [set() for _ in regions]
+    for i in range(len(regions)):
+        for j in range(i + 1, len(regions)):
+            if regions[i].IntersectsWith(regions[j]):
+                adjacency[i].add(j)
+                adjacency[j].add(i)
+    return adjacency
+
+
+def num_connected_components(adjacency, kept):
+    """
+    Count connected components of the region graph restricted to the region
+    indices in the set `kept`.
+    """
+    unvisited = set(kept)
+    num_components = 0
+    while unvisited:
+        num_components += 1
+        stack = [unvisited.pop()]
+        while stack:
+            node = stack.pop()
+            for neighbor in adjacency[node]:
+                if neighbor in unvisited:
+                    unvisited.remove(neighbor)
+                    stack.append(neighbor)
+    return num_components
+
+
+def prune_regions(regions_dict, sample_bank, max_coverage_loss=0.01, containment_threshold=0.98, keep=("set0",)):
+    """
+    Greedily remove the regions that uniquely contribute the least coverage.
+
+    Each region is scored by the number of collision-free samples in
+    sample_bank that lie in that region and in no other remaining region. A
+    region is a candidate for removal if at least containment_threshold of its
+    samples are also covered by other remaining regions. Candidates are removed
+    in order of increasing unique contribution as long as:
+      - the total coverage lost stays below max_coverage_loss (as a fraction of
+        all collision-free samples), and
+      - removing the region does not split the region graph into more
+        connected components than it started with.
+
+    regions_dict is a dictionary that maps region names to HPolyhedrons.
+
+    sample_bank is a SampleBank.
+
+    keep is an iterable of region names that are never removed (by default, the
+    source region around q_nominal).
+
+    Returns a dictionary mapping the kept region names to their regions.
+    """
+    names = list(regions_dict.keys())
+    regions = list(regions_dict.values())
+    num_samples = max(sample_bank.free_samples.shape[0], 1)
+
+    membership = sample_bank.membership(regions)  # (num regions) x (num samples)
+    region_sample_counts = membership.sum(axis=1)
+    cover_counts = membership.sum(axis=0).astype(int)  # Number of kept regions covering each sample
+
+    adjacency = region_adjacency(regions)
+    kept = set(range(len(regions)))
+    initial_num_components = num_connected_components(adjacency, kept)
+
+    initial_coverage = np.count_nonzero(cover_counts) / num_samples
+    coverage_loss = 0.0
+
+    while True:
+        # Samples covered only by region i are the ones lost if region i is removed
+        unique_counts = (membership & (cover_counts == 1)).sum(axis=1)
+
+        candidates = []
+        for i in kept:
+            if names[i] in keep:
+                continue
+            contained_fraction = 1.0 - unique_counts[i] / region_sample_counts[i] if region_sample_counts[i] > 0 else 1.0
+            if contained_fraction < containment_threshold:
+                continue
+            if coverage_loss + unique_counts[i] / num_samples > max_coverage_loss:
+                continue
+            candidates.append((unique_counts[i], i))
+
+        removed = False
+        for unique_count, i in sorted(candidates):
+            if num_connected_components(adjacency, kept - {i}) > initial_num_components:
+                continue
+            kept.remove(i)
+            cover_counts -= membership[i]
+            coverage_loss += unique_count / num_samples
+            removed = True
+            break
+
+        if not removed:
+            break
+
+    print(f"prune_regions: kept {len(kept)}/{len(regions)} regions; coverage {initial_coverage:.4f} -> {initial_coverage - coverage_loss:.4f}.")
+
+    return {names[i]: regions[i] for i in sorted(kept)}
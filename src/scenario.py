@@ -26,6 +26,10 @@ q_place_nominal = [1.55738942, -2.2127606, 2.02098258, 0.02843482, 1.7572682, 1.
 
 robot_pose = RigidTransform([0.0,0.0,0.58])
 
+# Interior of the truck trailer (between the floor, side walls, back and roof; see the Truck_Trailer_*.sdf files)
+TRAILER_INTERIOR_LOWER = np.array([-1.0, -1.27, 0.026])
+TRAILER_INTERIOR_UPPER = np.array([4.0, 1.27, 2.768])
+
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 relative_path_to_robot_base = os.path.join(current_dir, '../data/unload-gen0/robot_base.urdf')
@@ -39,6 +43,7 @@ relative_path_to_truck_trailer_back = os.path.join(current_dir, '../data/Truck_T
 relative_path_to_truck_trailer_right_side = os.path.join(current_dir, '../data/Truck_Trailer_Right_Side.sdf')
 relative_path_to_truck_trailer_left_side = os.path.join(current_dir, '../data/Truck_Trailer_Left_Side.sdf')
 relative_path_to_truck_trailer_roof = os.path.join(current_dir, '../data/Truck_Trailer_Roof.sdf')
+relative_path_to_box = os.path.join(current_dir, '../data/Box_0_5_0_5_0_5.sdf')
 
 absolute_path_to_robot_base = os.path.abspath(relative_path_to_robot_base)
 absolute_path_to_robot_arm = os.path.abspath(relative_path_to_robot_arm)
@@ -47,9 +52,9 @@ absolute_path_to_truck_trailer_back = os.path.abspath(relative_path_to_truck_tra
 absolute_path_to_truck_trailer_right_side = os.path.abspath(relative_path_to_truck_trailer_right_side)
 absolute_path_to_truck_trailer_left_side = os.path.abspath(relative_path_to_truck_trailer_left_side)
 absolute_path_to_truck_trailer_roof = os.path.abspath(relative_path_to_truck_trailer_roof)
+absolute_path_to_box = os.path.abspath(relative_path_to_box)
 
-scenario_yaml = f"""
-directives:
+robot_directives = f"""
 - add_model:
     name: robot_base
     file: file://{absolute_path_to_robot_base}
@@ -60,9 +65,8 @@ directives:
         translation: [{robot_pose.translation()[0]}, {robot_pose.translation()[1]}, {robot_pose.translation()[2]}]
 - add_weld:
     parent: robot_base::robot_base_offset
-    child: robot_base::base_link  
+    child: robot_base::base_link
 
-    
 - add_model:
     name: kuka
     file: file://{absolute_path_to_robot_arm}
@@ -75,39 +79,47 @@ directives:
         arm_a6: [{q_nominal[5]}]
 - add_weld:
     parent: robot_base::base
-    child: kuka::base_link 
-
+    child: kuka::base_link
+"""
 
-- add_model: 
+truck_trailer_walls_directives = f"""
+- add_model:
     name: Truck_Trailer_Floor
     file: file://{absolute_path_to_truck_trailer_floor}
 - add_weld:
     parent: world
     child: Truck_Trailer_Floor::Truck_Trailer_Floor
 
-
-- add_model: 
+- add_model:
     name: Truck_Trailer_Right_Side
     file: file://{absolute_path_to_truck_trailer_right_side}
 - add_weld:
     parent: world
     child: Truck_Trailer_Right_Side::Truck_Trailer_Right_Side
 
-
-- add_model: 
+- add_model:
     name: Truck_Trailer_Left_Side
     file: file://{absolute_path_to_truck_trailer_left_side}
 - add_weld:
     parent: world
     child: Truck_Trailer_Left_Side::Truck_Trailer_Left_Side
-    
-    
-- add_model: 
+"""
+
+# The roof is a free body in simulation so it can be moved out of the way while boxes are randomized (see set_up_scene())
+truck_trailer_roof_directives = f"""
+- add_model:
     name: Truck_Trailer_Roof
     file: file://{absolute_path_to_truck_trailer_roof}
+"""
 
+truck_trailer_roof_weld_directives = """
+- add_weld:
+    parent: world
+    child: Truck_Trailer_Roof::Truck_Trailer_Roof
+"""
 
-- add_model: 
+truck_trailer_back_directives = f"""
+- add_model:
     name: Truck_Trailer_Back
     file: file://{absolute_path_to_truck_trailer_back}
 - add_weld:
@@ -116,29 +128,35 @@ directives:
 """
 
 
-scenario_yaml_for_iris = scenario_yaml.replace(
-f"""
-model_drivers:
-    kuka: !ForceDriver {{}}  # ForceDriver allows access to desired_state and desired_acceleration input ports for station (results in better traj following)
-""",
-""
-)
+def make_scenario_yaml(weld_roof=False, extra_directives=""):
+    """
+    Compose the scenario YAML string from the directive blocks above.
 
-scenario_yaml_for_iris = scenario_yaml_for_iris.replace(
-f"""
-- add_model: 
-    name: Truck_Trailer_Roof
-    file: file://{absolute_path_to_truck_trailer_roof}
-""",
-f"""
-- add_model: 
-    name: Truck_Trailer_Roof
-    file: file://{absolute_path_to_truck_trailer_roof}
-- add_weld:
-    parent: world
-    child: Truck_Trailer_Roof::Truck_Trailer_Roof
+    weld_roof welds the truck trailer roof to the world (for IRIS, where the
+    roof is a static obstacle).
+
+    extra_directives is a string of additional directives to append (i.e. a
+    box welded to the end effector).
+    """
+    return ("\ndirectives:"
+            + robot_directives
+            + truck_trailer_walls_directives
+            + truck_trailer_roof_directives
+            + (truck_trailer_roof_weld_directives if weld_roof else "")
+            + truck_trailer_back_directives
+            + extra_directives)
+
+
+def make_box_directive(name, absolute_path_to_box):
+    return f"""
+- add_model:
+    name: {name}
+    file: file://{absolute_path_to_box}
 """
-)
+
+
+scenario_yaml = make_scenario_yaml()
+scenario_yaml_for_iris = make_scenario_yaml(weld_roof=True)
 
 
 robot_yaml = f"""
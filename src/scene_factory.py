@@ -0,0 +1,209 @@
+"""
+Scene factory so the robot and truck trailer model directives are parsed once
+per process, and each plant variant used by the pipeline (full simulation,
+IRIS, IRIS with a box welded to the end effector, controller, IK) is built from
+that cache, at most once, and only when it is actually needed.
+"""
+from pydrake.all import (
+    AddDefaultVisualization,
+    LoadModelDirectivesFromString,
+    MultibodyPlant,
+    Parser,
+    ProcessModelDirectives,
+    RigidTransform,
+    RobotDiagramBuilder,
+    SceneGraphCollisionChecker,
+    WeldJoint,
+)
+from manipulation.utils import ConfigureParser
+
+import os
+import threading
+
+from station import load_scenario, add_directives
+from parallelism import get_parallelism
+from scenario import BOX_DIM, scenario_yaml, scenario_yaml_for_iris, robot_yaml, absolute_path_to_box, make_box_directive
+
+
+class SceneFactory():
+    """
+    Caches parsed model directives (keyed by their YAML string) and every built
+    plant/diagram/collision checker variant.
+    """
+    def __init__(self, package_paths=None):
+        """
+        package_paths is a dictionary mapping package names to directories to
+        add to every parser's package map (by default, "cwd" maps to the
+        current working directory, so our own models can be referred to with
+        "package://cwd/...").
+        """
+        self.package_paths = package_paths if package_paths is not None else {"cwd": os.getcwd()}
+        self.directives_cache = {}  # Maps YAML string to ModelDirectives
+        self.variant_cache = {}  # Maps variant name to built object(s)
+        self.ik_lock = threading.Lock()  # ik_plant() is called from BatchIK's worker threads
+
+
+    def add_package_paths(self, parser):
+        """
+        Add package_paths to a parser's package map. Can be used as the
+        parser_preload_callback of MakeHardwareStation().
+        """
+        for name, path in self.package_paths.items():
+            if not parser.package_map().Contains(name):
+                parser.package_map().Add(name, path)
+
+
+    def configure_parser(self, parser):
+        ConfigureParser(parser)
+        self.add_package_paths(parser)
+
+
+    def directives(self, yaml_str):
+        """
+        Return the ModelDirectives for a YAML string, parsing it only the first
+        time.
+        """
+        if yaml_str not in self.directives_cache:
+            self.directives_cache[yaml_str] = LoadModelDirectivesFromString(yaml_str)
+        return self.directives_cache[yaml_str]
+
+
+    def add_models(self, parser, yaml_str):
+        """
+        Equivalent to parser.AddModelsFromString(yaml_str, ".dmd.yaml"), but
+        using the cached directives. Returns the list of added ModelInstanceIndex.
+        """
+        self.configure_parser(parser)
+        return [info.model_instance for info in ProcessModelDirectives(self.directives(yaml_str), parser)]
+
+
+    def station_scenario(self, num_boxes):
+        """
+        Scenario for MakeHardwareStation() (full simulation with num_boxes
+        free boxes).
+        """
+        key = ("station_scenario", num_boxes)
+        if key not in self.variant_cache:
+            scenario = load_scenario(data=scenario_yaml)
+            box_directives = "\ndirectives:\n" + "".join(make_box_directive(f"Boxes/Box_{i}", absolute_path_to_box) for i in range(num_boxes))
+            self.variant_cache[key] = add_directives(scenario, data=box_directives)
+        return self.variant_cache[key]
+
+
+    def controller_plant(self):
+        """
+        Finalized robot-only MultibodyPlant for the InverseDynamicsController.
+        """
+        if "controller_plant" not in self.variant_cache:
+            controller_plant = MultibodyPlant(time_step=0.001)
+            self.add_models(Parser(controller_plant), robot_yaml)
+            controller_plant.Finalize()
+            self.variant_cache["controller_plant"] = controller_plant
+        return self.variant_cache["controller_plant"]
+
+
+    def iris_diagram(self):
+        """
+        RobotDiagram of the robot and empty truck trailer (roof welded), used
+        for IRIS (and owned by the "iris" collision checker once it is built).
+
+        Returns the RobotDiagram and the list of robot ModelInstanceIndex.
+        """
+        if "iris" not in self.variant_cache:
+            robot_diagram_builder = RobotDiagramBuilder()
+            robot_model_instances = self.add_models(robot_diagram_builder.parser(), scenario_yaml_for_iris)
+            self.variant_cache["iris"] = (robot_diagram_builder.Build(), robot_model_instances)
+        return self.variant_cache["iris"]
+
+
+    def iris_eef_box_diagram(self, meshcat=None):
+        """
+        Same as iris_diagram(), but with a box welded to the end effector in
+        its "grabbed" pose (for the regions used while placing a box).
+
+        meshcat optionally adds default visualization; it only has an effect on
+        the first call since the diagram is cached.
+
+        Returns the RobotDiagram, the list of robot ModelInstanceIndex, and the
+        BodyIndex of the end effector and of the box.
+        """
+        if "iris_eef_box" not in self.variant_cache:
+            robot_diagram_builder = RobotDiagramBuilder()
+            robot_model_instances = self.add_models(robot_diagram_builder.parser(),
+                                                    scenario_yaml_for_iris + make_box_directive("Boxes/Box_eef", absolute_path_to_box))
+            plant = robot_diagram_builder.plant()
+
+            # Set pose of box to be in "grabbed" position relative to eef and weld it there
+            eef_model_idx = plant.GetModelInstanceByName("kuka")  # ModelInstanceIndex
+            eef_body_idx = plant.GetBodyIndices(eef_model_idx)[-1]  # BodyIndex
+            frame_parent = plant.get_body(eef_body_idx).body_frame()
+            box_model_idx = plant.GetModelInstanceByName("Boxes/Box_eef")  # ModelInstanceIndex
+            box_body_idx = plant.GetBodyIndices(box_model_idx)[0]  # BodyIndex
+            frame_child = plant.get_body(box_body_idx).body_frame()
+            plant.AddJoint(WeldJoint("box-eef", frame_parent, frame_child, RigidTransform([-BOX_DIM/2, -BOX_DIM/2, BOX_DIM*1.3])))
+            plant.Finalize()
+
+            if meshcat is not None:
+                AddDefaultVisualization(robot_diagram_builder.builder(), meshcat=meshcat)
+
+            self.variant_cache["iris_eef_box"] = (robot_diagram_builder.Build(), robot_model_instances, eef_body_idx, box_body_idx)
+        return self.variant_cache["iris_eef_box"]
+
+
+    def ik_plant(self):
+        """
+        Plant for IK and trajectory optimization, along with a new plant
+        context owned by the caller.
+
+        The plant is the same scene as iris_diagram(), but in a separate
+        RobotDiagram (built once, and kept by this factory), since
+        SceneGraphCollisionChecker takes ownership of the diagram it is given.
+        """
+        with self.ik_lock:
+            if "ik" not in self.variant_cache:
+                robot_diagram_builder = RobotDiagramBuilder()
+                self.add_models(robot_diagram_builder.parser(), scenario_yaml_for_iris)
+                self.variant_cache["ik"] = robot_diagram_builder.Build()
+        diagram = self.variant_cache["ik"]
+        context = diagram.CreateDefaultContext()
+        return diagram.plant(), diagram.plant().GetMyMutableContextFromRoot(context)
+
+
+    def collision_checker(self, variant="iris", edge_step_size=0.25):
+        """
+        SceneGraphCollisionChecker for the "iris" or "iris_eef_box" variant,
+        built once per variant (edge_step_size is only used on the first call;
+        use set_edge_step_size() to change it afterwards). Its parallelism is
+        taken from the shared parallelism setting at that time.
+        """
+        key = ("collision_checker", variant)
+        if key not in self.variant_cache:
+            collision_checker_params = {}
+            collision_checker_params["edge_step_size"] = edge_step_size
+            if variant == "iris":
+                diagram, robot_model_instances = self.iris_diagram()
+            elif variant == "iris_eef_box":
+                diagram, robot_model_instances, eef_body_idx, box_body_idx = self.iris_eef_box_diagram()
+            else:
+                raise ValueError(f"Unknown collision checker variant '{variant}'.")
+            collision_checker_params["robot_model_instances"] = robot_model_instances
+            collision_checker_params["model"] = diagram
+            get_parallelism().apply_to_checker_params(collision_checker_params)  # Number of per-thread contexts
+            collision_checker = SceneGraphCollisionChecker(**collision_checker_params)
+            if variant == "iris_eef_box":
+                collision_checker.SetCollisionFilteredBetween(eef_body_idx, box_body_idx, True)  # Filter collision between eef and box so IRIS doesn't fail immediately
+            self.variant_cache[key] = collision_checker
+        return self.variant_cache[key]
+
+
+_scene_factory = None
+
+
+def get_scene_factory():
+    """
+    Process-wide SceneFactory, so every module shares the same caches.
+    """
+    global _scene_factory
+    if _scene_factory is None:
+        _scene_factory = SceneFactory()
+    return _scene_factory
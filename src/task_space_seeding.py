@@ -0,0 +1,128 @@
+"""
+Task-space-guided seeding for clique covers. Instead of sampling configurations
+uniformly over the joint limits, end-effector poses are sampled inside the
+truck trailer workspace (BOXUNLOADING.sampling_bounds) and mapped to
+configuration space with IK, so region building focuses on the configurations
+actually used for unloading.
+
+Compared to clique_covers_seeding/task_space_sampling_test.py (which solves one
+IK at a time in a rejection loop), poses are sampled in batches, IK is solved in
+parallel workers (see batch_ik.py), and collision filtering is done with one
+batched collision-checker query per batch.
+"""
+from pydrake.all import (
+    Quaternion,
+    RigidTransform,
+)
+
+from scipy.spatial import Delaunay
+from scipy.spatial.transform import Rotation
+import numpy as np
+import time
+
+from parallelism import get_parallelism
+from batch_ik import BatchIK
+from clique_covers_seeding.task_space_sampling_regions.BOXUNLOADING import sampling_bounds as BOXUNLOADING_SAMPLING_BOUNDS
+
+
+def sample_task_space_poses(num_poses, sampling_bounds=BOXUNLOADING_SAMPLING_BOUNDS, rng=None):
+    """
+    Sample end-effector poses with positions uniformly distributed in the convex
+    hull of sampling_bounds and uniformly random orientations.
+
+    Returns an (N, 3) np array of positions and an (N, 4) np array of [w, x, y, z]
+    quaternions.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    vertices = np.array(sampling_bounds)
+    hull = Delaunay(vertices)
+    lower, upper = vertices.min(axis=0), vertices.max(axis=0)
+
+    # Vectorized rejection sampling from the bounding box of the hull
+    positions = np.zeros((0, 3))
+    while positions.shape[0] < num_poses:
+        candidates = rng.uniform(lower, upper, size=(2 * num_poses, 3))
+        positions = np.vstack((positions, candidates[hull.find_simplex(candidates) >= 0]))
+    positions = positions[:num_poses]
+
+    quaternions = Rotation.random(num_poses, random_state=rng).as_quat()  # [x, y, z, w] order
+    quaternions = quaternions[:, [3, 0, 1, 2]]
+
+    return positions, quaternions
+
+
+class TaskSpaceSeeder():
+    """
+    Generates collision-free configurations whose end-effector poses lie in the
+    task-space sampling region, for use as visibility graph points.
+
+    If num_workers > 1, the worker pool is created lazily and kept alive across
+    calls (so the cost of building a plant in each worker is only paid once)
+    until close(); TaskSpaceSeeder can also be used as a context manager.
+    """
+    def __init__(self, collision_checker, sampling_bounds=BOXUNLOADING_SAMPLING_BOUNDS, num_workers=1, batch_size=256, rotation_error=0.05):
+        """
+        collision_checker is used for batched collision filtering of the IK
+        solutions (so any configuration-space obstacles set on it are also
+        respected).
+
+        num_workers is 1 by default, which solves IK in-process; None uses the
+        shared parallelism setting (see parallelism.py). Only use a process
+        pool from offline scripts, not after a simulator or Meshcat has been
+        started in the same process.
+        """
+        self.collision_checker = collision_checker
+        self.sampling_bounds = sampling_bounds
+        self.batch_size = batch_size
+        self.rotation_error = rotation_error
+        self.batch_ik = BatchIK(num_workers=num_workers)
+        self.batch_ik.quiet = self.batch_ik.num_workers > 1 and self.batch_ik.backend == "processes"  # Only silence worker processes
+
+
+    def close(self):
+        self.batch_ik.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def _solve_ik_batch(self, positions, quaternions):
+        poses = [RigidTransform(Quaternion(quat / np.linalg.norm(quat)), p) for p, quat in zip(positions, quaternions)]
+        return self.batch_ik.solve(poses, translation_error=0, rotation_error=self.rotation_error)
+
+
+    def sample(self, num_points, seed=0, max_batches=50):
+        """
+        Returns a cspace_dim x N np array (N <= num_points) of collision-free
+        IK solutions for poses sampled in the task-space sampling region.
+        """
+        rng = np.random.default_rng(seed)
+        points = []
+        num_poses = 0
+        start = time.time()
+        for _ in range(max_batches):
+            positions, quaternions = sample_task_space_poses(self.batch_size, self.sampling_bounds, rng)
+            qs, successes = self._solve_ik_batch(positions, quaternions)
+            num_poses += len(positions)
+
+            qs = qs[successes]
+            if len(qs) > 0:
+                collision_free = np.array(self.collision_checker.CheckConfigsCollisionFree(list(qs), get_parallelism().drake_parallelism()), dtype=bool)
+                points.extend(qs[collision_free])
+
+            if len(points) >= num_points:
+                break
+
+        points = np.array(points[:num_points]).reshape(-1, self.collision_checker.plant().num_positions())
+        print(f"TaskSpaceSeeder: {len(points)} collision-free seed points from {num_poses} sampled poses in {time.time() - start:.2f}s.")
+        return points.T
+
+
+    def close(self):
+        self.batch_ik.close()
@@ -7,13 +7,12 @@ from pydrake.all import (
     MultibodyPlant,
     Parser,
     configure_logging,
-    InverseKinematics,
     RotationMatrix,
     RollPitchYaw,
     LeafSystem,
     BasicVector,
     ConstantVectorSource,
-    Solve,
+    EventStatus,
 )
 
 # from manipulation.station import MakeHardwareStation, load_scenario
@@ -34,82 +33,99 @@ import logging
 import datetime
 
 from scenario import NUM_BOXES, BOX_DIM, q_nominal, q_place_nominal, scenario_yaml, robot_yaml, robot_pose, set_up_scene, get_W_X_eef
+from ik_tracker import IKTracker
 
 NUM_BOXES = 0
 
 class MeshcatSliderSource(LeafSystem):
-    def __init__(self, meshcat):
+    """
+    Outputs the Meshcat slider values, polled every poll_period seconds of
+    simulation time instead of on every output evaluation (polling happens in
+    a periodic event rather than a background thread, since Meshcat can only
+    be queried from the thread that created it). The values are cached in
+    discrete state along with a version counter that's incremented whenever
+    any of them changes, so downstream systems can skip work when nothing has.
+    """
+    def __init__(self, meshcat, poll_period=0.05):
         LeafSystem.__init__(self)
         self.meshcat = meshcat
 
+        if joint_control:
+            self.slider_names = ['q1', 'q2', 'q3', 'q4', 'q5', 'q6']
+        else:
+            self.slider_names = ['x', 'y', 'z', 'roll', 'pitch', 'yaw']
+        self.num_sliders = len(self.slider_names)
+        self.DeclareDiscreteState(self.num_sliders + 1)  # Slider values, then the version counter
+        self.DeclareInitializationDiscreteUpdateEvent(self.Poll)
+        self.DeclarePeriodicDiscreteUpdateEvent(poll_period, 0, self.Poll)
+
         if joint_control:
             self.DeclareVectorOutputPort("slider_values", BasicVector(12), self.DoCalcOutput)
         else:
             self.DeclareVectorOutputPort("slider_values", BasicVector(6), self.DoCalcOutput)
+        self.DeclareVectorOutputPort("version", BasicVector(1), self.CalcVersion)
+
+    def Poll(self, context, discrete_state):
+        state = context.get_discrete_state_vector().get_value()
+        values = np.array([self.meshcat.GetSliderValue(name) for name in self.slider_names])
+        version = state[-1] + (0 if np.array_equal(values, state[:-1]) else 1)
+        discrete_state.get_mutable_vector().SetFromVector(np.append(values, version))
+        return EventStatus.Succeeded()
 
     def DoCalcOutput(self, context, output):
+        values = context.get_discrete_state_vector().get_value()[:self.num_sliders]
         if joint_control:
-            q1 = self.meshcat.GetSliderValue('q1')
-            q2 = self.meshcat.GetSliderValue('q2')
-            q3 = self.meshcat.GetSliderValue('q3')
-            q4 = self.meshcat.GetSliderValue('q4')
-            q5 = self.meshcat.GetSliderValue('q5')
-            q6 = self.meshcat.GetSliderValue('q6')
-            output.SetFromVector([q1, q2, q3, q4, q5, q6, 0, 0, 0, 0, 0, 0])
+            output.SetFromVector(np.concatenate([values, np.zeros(6)]))
         else:
-            x = self.meshcat.GetSliderValue('x')
-            y = self.meshcat.GetSliderValue('y')
-            z = self.meshcat.GetSliderValue('z')
-            roll = self.meshcat.GetSliderValue('roll')
-            pitch = self.meshcat.GetSliderValue('pitch')
-            yaw = self.meshcat.GetSliderValue('yaw')
-            output.SetFromVector([x, y, z, roll, pitch, yaw])
+            output.SetFromVector(values)
+
+    def CalcVersion(self, context, output):
+        output.SetFromVector(context.get_discrete_state_vector().get_value()[-1:])
 
 
 class InverseKinematicsSystem(LeafSystem):
-    def __init__(self, plant, meshcat):
+    """
+    Solves IK for the slider pose every poll_period seconds (only if the
+    slider version has changed since the last solve). The version of the last
+    solve and the resulting desired state are kept in discrete state, so the
+    output calculations are pure and the system behaves correctly across
+    context clones and simulator resets.
+    """
+    def __init__(self, plant, meshcat, ik_mode="auto", poll_period=0.05):
         LeafSystem.__init__(self)
         self.plant = plant
         self.meshcat = meshcat
+        self.ik_tracker = IKTracker(plant, mode=ik_mode)  # Persistent, warm-started from the previous solution
         self.DeclareVectorInputPort("slider_values", BasicVector(6))
+        self.DeclareVectorInputPort("slider_version", BasicVector(1))
+        self.DeclareDiscreteState(np.concatenate([q_nominal, np.zeros(6), [-1]]))  # Desired state, then the slider version it was solved for (none yet)
+        self.DeclarePeriodicDiscreteUpdateEvent(poll_period, 0, self.UpdateDesiredState)
         self.DeclareVectorOutputPort("desired_state", BasicVector(12), self.CalculateDesiredState)
         self.DeclareVectorOutputPort("desired_acceleration", BasicVector(6), self.CalculateDesiredAcceleration)
-        
-    def CalculateDesiredState(self, context, output):
+
+    def UpdateDesiredState(self, context, discrete_state):
+        state = context.get_discrete_state_vector().get_value()
+        version = self.get_input_port(1).Eval(context)[0]
+        if version == state[-1]:  # Sliders haven't moved
+            return EventStatus.DidNothing()
+
+        q_previous = state[:6]
+        if not np.array_equal(self.ik_tracker.q, q_previous):  # i.e. after a simulator reset; warm-start from this context's solution
+            self.ik_tracker.reset(q_previous)
+
         slider_values = self.get_input_port(0).Eval(context)
         x, y, z, roll, pitch, yaw = slider_values
         desired_pose = RigidTransform(RotationMatrix(RollPitchYaw(roll, pitch, yaw)), [x, y, z])
         
-        ik = InverseKinematics(self.plant)
-        ik.AddPositionConstraint(
-            self.plant.GetFrameByName("arm_eef"),
-            [0, 0, 0],
-            self.plant.world_frame(),
-            desired_pose.translation(),
-            desired_pose.translation()
-        )
-        ik.AddOrientationConstraint(
-            self.plant.GetFrameByName("arm_eef"),
-            RotationMatrix(),
-            self.plant.world_frame(),
-            desired_pose.rotation(),
-            0.0
-        )
-        
-        prog = ik.prog()
-        initial_guess = np.zeros(6)
-        prog.SetInitialGuess(ik.q(), q_nominal)
-        result = Solve(prog)
-        
-        if result.is_success():
-            q_solution = result.GetSolution(ik.q())
-            v_solution = np.zeros_like(q_solution)  # Assuming zero velocity for simplicity
-            desired_state = np.concatenate([q_solution, v_solution])
-        else:
-            print("ik fail; defaulting to zero state.")
-            desired_state = np.zeros(12)
-            
-        output.SetFromVector(desired_state)
+        q_solution, success = self.ik_tracker.update(desired_pose)
+        if not success:
+            print("ik fail; holding last solution.")
+        v_solution = np.zeros_like(q_solution)  # Assuming zero velocity for simplicity
+        discrete_state.get_mutable_vector().SetFromVector(np.concatenate([q_solution, v_solution, [version]]))
+        return EventStatus.Succeeded()
+
+    def CalculateDesiredState(self, context, output):
+        output.SetFromVector(context.get_discrete_state_vector().get_value()[:12])
 
     def CalculateDesiredAcceleration(self, context, output):
         # Assuming zero acceleration for simplicity
@@ -127,6 +143,7 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--fast', default='T', help="T/F; whether or not to use a pre-saved box configuration or randomize box positions from scratch.")
 parser.add_argument('--randomization', default=0, help="integer randomization seed.")
 parser.add_argument('--joint_control', default='F', help="T/F; whether to control joint positions (instead of xyz rpy)")
+parser.add_argument('--ik_mode', default='auto', help="full/differential/auto; how the IK tracks slider changes (see ik_tracker.py)")
 args = parser.parse_args()
 
 seed = int(args.randomization)
@@ -232,10 +249,11 @@ if joint_control:
 
 else:
     # Add IK System
-    ik_system = builder.AddSystem(InverseKinematicsSystem(controller_plant, meshcat))
+    ik_system = builder.AddSystem(InverseKinematicsSystem(controller_plant, meshcat, args.ik_mode))
 
     # Connect sliders to IK system
     builder.Connect(slider_source.get_output_port(0), ik_system.get_input_port(0))
+    builder.Connect(slider_source.get_output_port(1), ik_system.get_input_port(1))
 
     controller = builder.AddSystem(InverseDynamicsController(controller_plant, [150]*num_robot_positions, [50]*num_robot_positions, [50]*num_robot_positions, True))  # True = exposes "desired_acceleration" port
     builder.Connect(station.GetOutputPort("kuka_state"), controller.GetInputPort("estimated_state"))
@@ -6,11 +6,6 @@ from pydrake.all import (
     MultibodyPlant,
     Context,
     VPolytope,
-    Point,
-    InverseKinematics,
-    Solve,
-    logical_or,
-    logical_and
 )
 
 from typing import BinaryIO, Union
@@ -21,7 +16,7 @@ import os
 import sys
 import time
 
-from scenario import q_nominal
+from ik_service import get_ik_service
 
 
 def diagram_visualize_connections(diagram: Diagram, file: Union[BinaryIO, str]) -> None:
@@ -80,7 +75,7 @@ class SuppressOutput:
         os.close(self.devnull)
 
 
-def ik(plant, plant_context, pose, translation_error=0, rotation_error=0.05, regions=None, pose_as_constraint=True):
+def ik(plant, plant_context, pose, translation_error=0, rotation_error=0.05, regions=None, pose_as_constraint=True, num_regions_to_try=5, project_onto_regions=False):
     """
     Use Inverse Kinematics to solve for a configuration that satisfies a
     task-space pose. 
@@ -94,68 +89,19 @@ def ik(plant, plant_context, pose, translation_error=0, rotation_error=0.05, reg
     program will strictly ensure the returned solution falls within one of the
     regions but do its best on the desired pose.
 
+    Regions are tried nearest-first (measured from the IK solution without a
+    region constraint), and only the num_regions_to_try nearest ones are tried
+    (None to try all of them).
+
+    project_onto_regions can be set to True (with pose_as_constraint=False) to
+    solve the IK once without region constraints and project the solution onto
+    the nearest region instead of solving one IK per region; this is much
+    faster but the pose is only approximately optimized within the region.
+
+    The IK programs are built once per plant context and reused across calls
+    (see ik_service.py).
+
     Returns the result of the IK program and a boolean for whether the program
     and all constraint were successfully solved.
     """
-    satisfy_regions_constraint = regions is not None
-    if regions is None:  # Make regions not None so that the for loop below runs at least once
-        regions = {"_": Point(np.zeros(6))}
-
-    # Separate IK program for each region with the constraint that the IK result must be in that region
-    ik_start = time.time()
-    solve_success = False
-    for region in list(regions.values()):
-        ik = InverseKinematics(plant, plant_context)
-        q_variables = ik.q()  # Get variables for MathematicalProgram
-        ik_prog = ik.get_mutable_prog()
-
-        # q_variables must be within half-plane for every half-plane in region
-        if satisfy_regions_constraint:
-            ik_prog.AddConstraint(logical_and(*[expr <= const for expr, const in zip(region.A() @ q_variables, region.b())]))
-
-        if pose_as_constraint:
-            ik.AddPositionConstraint(
-                frameA=plant.world_frame(),
-                frameB=plant.GetFrameByName("arm_eef"),
-                p_BQ=[0, 0, 0],
-                p_AQ_lower=pose.translation() - translation_error,
-                p_AQ_upper=pose.translation() + translation_error,
-            )
-            ik.AddOrientationConstraint(
-                frameAbar=plant.world_frame(),
-                R_AbarA=pose.rotation(),
-                frameBbar=plant.GetFrameByName("arm_eef"),
-                R_BbarB=RotationMatrix(),
-                theta_bound=rotation_error,
-            )
-            ik_prog.AddQuadraticErrorCost(np.identity(len(q_variables)), q_nominal, q_variables)
-        else:
-            # Add costs instead of constraints for pose
-            ik.AddPositionCost(plant.world_frame(),
-                               pose.translation(),
-                               plant.GetFrameByName("arm_eef"),
-                               [0, 0, 0],
-                               np.identity(3))
-            ik.AddOrientationCost(plant.world_frame(),
-                                  pose.rotation(),
-                                  plant.GetFrameByName("arm_eef"),
-                                  RotationMatrix(),
-                                  1)
-
-        ik_prog.SetInitialGuess(q_variables, q_nominal)
-        ik_result = Solve(ik_prog)
-        if ik_result.is_success():
-            q = ik_result.GetSolution(q_variables)  # (6,) np array
-            print(f"IK solve succeeded. q: {q}")
-            solve_success = True
-            break
-        # else:
-            # print(f"ERROR: IK fail: {ik_result.get_solver_id().name()}: {ik_result.GetInfeasibleConstraintNames(ik_prog)}")
-
-    # print(f"IK Runtime: {time.time() - ik_start}")
-
-    if solve_success == False:
-        print(f"ERROR: IK fail: {ik_result.get_solver_id().name()}. Returning Best Guess.")
-        return ik_result.GetSolution(q_variables), False
-    
-    return q, True
\ No newline at end of file
+    return get_ik_service(plant, plant_context).solve(pose, translation_error, rotation_error, regions, pose_as_constraint, num_regions_to_try, project_onto_regions)
@@ -7,6 +7,8 @@ import numpy as np
 import time
 
 from scenario import scenario_yaml_for_iris
+from edge_cache import EdgeResultStore, build_visibility_graph, scene_fingerprint
+from parallelism import get_parallelism
 
 
 # Generate regions with no obstacles at all
@@ -19,12 +21,15 @@ collision_checker_params = {}
 collision_checker_params["robot_model_instances"] = robot_model_instances
 collision_checker_params["model"] = robot_diagram_builder_diagram
 collision_checker_params["edge_step_size"] = 0.01
+get_parallelism().apply_to_checker_params(collision_checker_params)
 collision_checker = SceneGraphCollisionChecker(**collision_checker_params)
 
 
 from pydrake.all import HPolyhedron, RandomGenerator, VisibilityGraph, IrisFromCliqueCoverOptions, IrisInConfigurationSpaceFromCliqueCover
 from time import time
 generator = RandomGenerator(0)
+edge_store = EdgeResultStore("../data/visibility_graph_edges.pkl")
+fingerprint = scene_fingerprint(collision_checker, scenario_yaml_for_iris)
 domain = HPolyhedron.MakeBox(collision_checker.plant().GetPositionLowerLimits(),
                            collision_checker.plant().GetPositionUpperLimits())
 
@@ -43,10 +48,18 @@ for n in [int(1e1), int(1e2), int(1e3), int(1e4)]:
     t1 = time()
     print(f"{n = }")
     print(f"time to get points = {t1 - t0}")
-    G = VisibilityGraph(collision_checker, points)
+    G = VisibilityGraph(collision_checker, points, get_parallelism().drake_parallelism())
     t2 = time()
 
     print(f"time for visibility_graph = {t2-t1}")
+
+    # Same graph using the persistent edge store; the generator is seeded once, so the samples for each n are the
+    # same on every run of this script, and on a second run the cached graphs are reused without checking any edges
+    G_cached = build_visibility_graph(collision_checker, points, edge_store, fingerprint)
+    t3 = time()
+    print(f"time for cached visibility_graph = {t3-t2}")
+    edge_store.print_stats()
+    edge_store.save()
     print()
 
 